@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.db.database import get_db
 from app.services.sql_parser import SQLParser
@@ -10,8 +11,17 @@ from typing import Dict, List, Any, Optional
 from pydantic import BaseModel
 import asyncio
 import hashlib
+import time
+import orjson
 from app.core.logger import logger
-from app.services.merge_service import MergeService
+from app.services.merge_service import DeferredJoinError, MergeService
+from app.services.merge_pool import merge_pool
+from app.services.http_client import http_client_manager
+from app.services.plan_cache import plan_cache, canonical_plan
+from app.services.mapping_registry import mapping_registry
+from app.services.response_cache import response_cache
+from app.services.api_caller import APICaller
+from app.core.config import settings
 
 class SQLExecuteRequest(BaseModel):
     reportId: int
@@ -23,63 +33,76 @@ class SQLExecuteResponse(BaseModel):
     message: str = "success"
     data: Any = None
     cache_hit: bool = False
+    stale: bool = False
 
 router = APIRouter()
 cache_service = CacheService()
 
-def get_cache_key(sql: str) -> str:
-    """生成缓存key"""
-    return f"sql_result:{hashlib.md5(sql.encode()).hexdigest()}"
+def get_cache_key(parsed_results: Dict[str, Any]) -> str:
+    """根据解析结果的规范形式生成缓存key，空白、大小写、注释及条件顺序不同的等价SQL共享缓存"""
+    canonical = orjson.dumps(canonical_plan(parsed_results), default=str)
+    return f"sql_result:{hashlib.md5(canonical).hexdigest()}"
+
+class _QueryExecutionError(Exception):
+    """查询执行失败，结果不缓存"""
+    def __init__(self, error: Dict):
+        super().__init__(error['message'])
+        self.error = error
 
 @router.post("/execute", response_model=SQLExecuteResponse)
 async def execute_sql(
     request: SQLExecuteRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     try:
         logger.info(f"收到SQL执行请求: {request.sql}")
         
-        # 检查缓存
-        cache_key = get_cache_key(request.sql)
-        cached_result = cache_service.get(cache_key)
-        if cached_result:
-            logger.info("命中缓存")
-            return SQLExecuteResponse(
-                status=0,
-                message="success (cached)",
-                data=cached_result,
-                cache_hit=True
-            )
-        
-        # 解析SQL
+        # 解析SQL（解析结果有缓存）
         parser = SQLParser()
         parsed_results = parser.parse_sql(request.sql)
         logger.debug(f"SQL解析结果: {parsed_results}")
+        # 执行过程会修改解析结果中的请求参数，需先生成缓存key
+        cache_key = get_cache_key(parsed_results)
         
-        # 并行调用API
-        api_service = APIService()
-        all_results, error = await api_service.execute_api_calls(parsed_results['tables'],parsed_results['join_conditions'], db)
+        async def load_result():
+            # 并行调用API
+            api_service = APIService()
+            all_results, error = await api_service.execute_api_calls(
+                parsed_results['tables'], parsed_results['join_conditions'], db, parsed_results['where_conditions']
+            )
+            
+            if error:
+                raise _QueryExecutionError(error)
+            
+            # 合并结果（在进程池中连接时，连接失败与在API调用阶段连接失败返回相同的错误）
+            merge_service = MergeService()
+            try:
+                final_result = await merge_service.merge_results(all_results, parsed_results)
+            except DeferredJoinError as e:
+                raise _QueryExecutionError(e.error)
+            logger.info("所有API调用成功完成")
+            return final_result
         
-        if error:
+        # 检查缓存，未命中时执行查询并写入缓存（相同SQL的并发请求只执行一次）
+        try:
+            final_result, cache_hit, stale = await cache_service.get_or_load(cache_key, load_result)
+        except _QueryExecutionError as e:
             return SQLExecuteResponse(
-                status=error['status'],
-                message=error['message'],
+                status=e.error['status'],
+                message=e.error['message'],
                 data=[]
             )
         
-        # 合并结果
-        merge_service = MergeService()
-        final_result = await merge_service.merge_results(all_results, parsed_results)
-        
-        # 异步保存缓存
-        background_tasks.add_task(
-            cache_service.set,
-            cache_key,
-            final_result
-        )
+        if cache_hit:
+            logger.info("命中缓存（过期数据，后台刷新中）" if stale else "命中缓存")
+            return SQLExecuteResponse(
+                status=0,
+                message="success (cached)",
+                data=final_result,
+                cache_hit=True,
+                stale=stale
+            )
         
-        logger.info("所有API调用成功完成")
         return SQLExecuteResponse(
             status=0,
             message="success",
@@ -94,4 +117,85 @@ async def execute_sql(
             data=[]
         )
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@router.post("/execute/stream")
+async def execute_sql_stream(
+    request: SQLExecuteRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    以NDJSON流式返回查询结果：每行一个JSON对象，最后一行为状态和统计信息
+    结果在合并、过滤、字段筛选的同时逐批写出，不构建完整结果列表（在进程池中合并的大结果集除外）；
+    新鲜的缓存结果直接输出，未命中时的结果不写入缓存
+    """
+    logger.info(f"收到SQL流式执行请求: {request.sql}")
+    return StreamingResponse(_stream_rows(request.sql, db), media_type="application/x-ndjson")
+
+async def _stream_rows(sql: str, db: Session):
+    start = time.perf_counter()
+    trailer = {'_trailer': True, 'status': 0, 'message': 'success', 'rows': 0, 'cache_hit': False}
+    try:
+        parsed_results = SQLParser().parse_sql(sql)
+        cached = await cache_service.get_fresh(get_cache_key(parsed_results))
+        if cached is not None:
+            trailer['cache_hit'] = True
+            rows = iter(cached)
+        else:
+            all_results, error = await APIService().execute_api_calls(
+                parsed_results['tables'], parsed_results['join_conditions'], db, parsed_results['where_conditions']
+            )
+            if error:
+                trailer.update(status=error['status'], message=error['message'])
+                rows = iter(())
+            elif MergeService.should_offload(all_results):
+                # 大结果集在进程池中合并完成后再逐批写出
+                try:
+                    rows = iter(await MergeService.merge_results(all_results, parsed_results))
+                except DeferredJoinError as e:
+                    trailer.update(status=e.error['status'], message=e.error['message'])
+                    rows = iter(())
+            else:
+                rows = MergeService.iter_results(all_results, parsed_results)
+
+        chunk = []
+        for row in rows:
+            chunk.append(orjson.dumps(row, default=str))
+            if len(chunk) >= settings.STREAM_CHUNK_ROWS:
+                trailer['rows'] += len(chunk)
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+                # 让出事件循环，避免大结果集长时间占用
+                await asyncio.sleep(0)
+        if chunk:
+            trailer['rows'] += len(chunk)
+            yield b"\n".join(chunk) + b"\n"
+    except Exception as e:
+        logger.error(f"SQL流式执行异常: {str(e)}", exc_info=True)
+        trailer.update(status=1001, message=f"SQL解析异常: {str(e)}")
+
+    trailer['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"流式输出完成: {trailer}")
+    yield orjson.dumps(trailer) + b"\n"
+
+@router.get("/metrics")
+async def get_metrics():
+    """运行时指标"""
+    return {
+        'http_pool': http_client_manager.get_metrics(),
+        'api_caller': APICaller.get_stats(),
+        'plan_cache': plan_cache.get_stats(),
+        'mapping_registry': mapping_registry.get_stats(),
+        'result_cache': cache_service.get_stats(),
+        'response_cache': response_cache.get_stats(),
+        'merge_pool': merge_pool.get_stats()
+    }
+
+@router.post("/admin/mappings/reload")
+async def reload_mappings():
+    """强制从数据库重新加载API映射"""
+    try:
+        count = await mapping_registry.reload()
+    except Exception as e:
+        raise DatabaseError(f"重新加载API映射失败: {str(e)}")
+    return {'status': 0, 'message': 'success', 'data': {'mappings': count}}
@@ -13,9 +13,24 @@ class APIMapping(Base):
     method = Column(String(50), nullable=False)
     request_template = Column(String, nullable=True)
 
-    def get_template_json(self):
-        """将request_template字符串转换为JSON对象"""
+    def _load_template(self):
         try:
             return json.loads(self.request_template) if self.request_template else {}
         except json.JSONDecodeError:
             return {}
+
+    def get_template_json(self):
+        """将request_template字符串转换为JSON对象（不含 _options 元数据）"""
+        template = self._load_template()
+        if isinstance(template, dict):
+            template.pop('_options', None)
+        return template
+
+    def get_options(self):
+        """
+        获取映射的扩展配置，保存在request_template的 _options 键中，例如:
+        {"_options": {"batch_params": {"id": "ids"}, "batch_size": 100}}
+        """
+        template = self._load_template()
+        options = template.get('_options', {}) if isinstance(template, dict) else {}
+        return options if isinstance(options, dict) else {}
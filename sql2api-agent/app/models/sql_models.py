@@ -20,7 +20,7 @@ class WhereCondition:
     table: str       # 表名/别名
     column: str      # 字段名
     value: str       # 条件值
-    operator: str    # 操作符类型 ('=', 'LIKE', 'IN', 'order by')
+    operator: str    # 操作符类型 ('=', '>', '>=', '<', '<=', '!=', 'LIKE', 'IN', 'order by')
 
 @dataclass
 class JoinCondition:
@@ -30,6 +30,7 @@ class JoinCondition:
     rightTable: str   # 右表名/别名
     rightColumn: str  # 右表字段
     sequence: int     # JOIN序号，标识JOIN的顺序关系
+    joinType: str = 'INNER'  # JOIN类型(INNER/LEFT/RIGHT)
 
 
 @dataclass
@@ -1,65 +1,161 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import httpx
 import asyncio
+import copy
+import hashlib
+import orjson
+from app.core.config import settings
 from app.core.logger import logger
-from tenacity import retry, stop_after_attempt, wait_exponential
+from app.services.http_client import http_client_manager
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential
 import json
 
+
+def request_key(api_config: Dict, params: Dict) -> str:
+    """规范化的上游请求key：方法、URL、模板和参数（字典按键排序）"""
+    raw = orjson.dumps(
+        [api_config['method'].upper(), api_config['url'], api_config.get('template'), params],
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        default=str
+    )
+    return hashlib.md5(raw).hexdigest()
+
+
+class _InflightCall:
+    """
+    进行中的上游调用及其等待者数量
+    调用方会就地修改响应（如按列类型转换行），每个等待者各自拿到一份副本：
+    响应序列化一次，依次取结果的等待者各自反序列化，最后一个取结果的等待者直接使用原响应
+    """
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self._payload: Optional[bytes] = None
+
+    def take_result(self) -> Any:
+        """调用完成后由等待者调用，此时 waiters 包含当前等待者"""
+        response = self.task.result()
+        if self.waiters <= 1:
+            return response
+        if self._payload is None:
+            try:
+                self._payload = orjson.dumps(response)
+            except TypeError:
+                # 超出64位的整数等orjson无法序列化的值
+                return copy.deepcopy(response)
+        return orjson.loads(self._payload)
+
+
 class APICaller:
+    # 进程内进行中的上游调用，相同请求的并发调用方共享同一次调用
+    _inflight: Dict[str, _InflightCall] = {}
+    calls_total = 0
+    calls_coalesced = 0
+
     def __init__(self):
-        self.timeout = 30  # 30秒超时
-        self.max_retries = 3
+        self.timeout = settings.API_TIMEOUT
+        self.max_retries = settings.API_MAX_RETRIES
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
     async def call_api_async(self, api_config: Dict, params: Dict) -> Any:
-        """异步调用API，带重试机制"""
+        """异步调用API，相同的并发请求合并为一次上游调用"""
+        APICaller.calls_total += 1
+        if not settings.API_COALESCE_REQUESTS:
+            return await self._call_api_with_retry(api_config, params)
+
+        # 调用过程会修改模板，需在调用前生成key
+        key = request_key(api_config, params)
+        inflight = APICaller._inflight.get(key)
+        if inflight is None:
+            inflight = _InflightCall(asyncio.ensure_future(self._call_api_with_retry(api_config, params)))
+            APICaller._inflight[key] = inflight
+            inflight.task.add_done_callback(lambda _: self._remove_inflight(key, inflight))
+        else:
+            APICaller.calls_coalesced += 1
+
+        inflight.waiters += 1
+        try:
+            await asyncio.shield(inflight.task)
+            return inflight.take_result()
+        except asyncio.CancelledError:
+            # 最后一个等待者取消时才取消共享的上游调用
+            if inflight.waiters == 1 and not inflight.task.done():
+                inflight.task.cancel()
+            raise
+        finally:
+            inflight.waiters -= 1
+
+    @staticmethod
+    def _remove_inflight(key: str, inflight: _InflightCall):
+        if APICaller._inflight.get(key) is inflight:
+            del APICaller._inflight[key]
+
+    @staticmethod
+    def get_stats() -> Dict[str, Any]:
+        return {
+            'calls_total': APICaller.calls_total,
+            'calls_coalesced': APICaller.calls_coalesced,
+            'in_flight': len(APICaller._inflight)
+        }
+
+    async def _call_api_with_retry(self, api_config: Dict, params: Dict) -> Any:
+        """异步调用API，失败时按 API_MAX_RETRIES 重试"""
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(max(1, self.max_retries)),
+            wait=wait_exponential(multiplier=1, min=4, max=10)
+        ):
+            with attempt:
+                return await self._call_api(api_config, params)
+
+    async def _call_api(self, api_config: Dict, params: Dict) -> Any:
+        """单次调用API"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                if api_config['method'].upper() == 'GET':
-                    response = await client.get(
-                        api_config['url'],
-                        params=params
-                    )
+            # 使用进程级共享客户端，复用连接
+            if api_config['method'].upper() == 'GET':
+                response = await http_client_manager.request(
+                    'GET',
+                    api_config['url'],
+                    params=params,
+                    timeout=self.timeout
+                )
+            else:
+                template = dict(api_config['template'])
+                if 'params' in template:
+                    template['params'].update(params)
                 else:
-                    template = dict(api_config['template'])
-                    if 'params' in template:
-                        template['params'].update(params)
-                    else:
-                        template.update(params)
-                        
-                    response = await client.post(
-                        api_config['url'],
-                        json=template
-                    )
-                
-                response.raise_for_status()
-                
-                # 处理空响应的情况
-                if not response.content:
-                    logger.warning(f"API返回空响应: {api_config['url']}")
-                    return []
-                
-                try:
-                    # 先进行 UTF-8 解码
-                    content_str = response.content.decode('utf-8')
-                    logger.debug(f"API响应内容: {content_str}")
+                    template.update(params)
                     
-                    # 如果解码后的内容为空，返回空列表
-                    if not content_str.strip():
-                        return []
-                    
-                    # 解析 JSON
-                    return json.loads(content_str)
-                except UnicodeDecodeError as e:
-                    logger.error(f"响应内容解码失败: {response.content}", exc_info=True)
-                    return []
-                except json.JSONDecodeError as e:
-                    logger.error(f"API响应解析失败: {content_str}", exc_info=True)
+                response = await http_client_manager.request(
+                    'POST',
+                    api_config['url'],
+                    json=template,
+                    timeout=self.timeout
+                )
+            
+            response.raise_for_status()
+            
+            # 处理空响应的情况
+            if not response.content:
+                logger.warning(f"API返回空响应: {api_config['url']}")
+                return []
+            
+            try:
+                # 先进行 UTF-8 解码
+                content_str = response.content.decode('utf-8')
+                logger.debug(f"API响应内容: {content_str}")
+                
+                # 如果解码后的内容为空，返回空列表
+                if not content_str.strip():
                     return []
                 
+                # 解析 JSON
+                return json.loads(content_str)
+            except UnicodeDecodeError as e:
+                logger.error(f"响应内容解码失败: {response.content}", exc_info=True)
+                return []
+            except json.JSONDecodeError as e:
+                logger.error(f"API响应解析失败: {content_str}", exc_info=True)
+                return []
+            
         except httpx.TimeoutException:
             logger.error(f"API调用超时: {api_config['url']}")
             raise
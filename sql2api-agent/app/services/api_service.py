@@ -1,10 +1,29 @@
 from typing import Dict, List, Any, Optional, Tuple
+from functools import partial
 import asyncio
+import time
 from app.core.logger import logger
+from app.core.config import settings
 from app.services.api_caller import APICaller
-from app.db.models import APIMapping
+from app.services.column_schema import ColumnSchema, to_json_value
+from app.services.join_service import JoinService
+from app.services.mapping_registry import CachedAPIMapping, mapping_registry
+from app.services.merge_pool import merge_pool
+from app.services.merge_service import MergeService
+from app.services.pagination import Pagination
+from app.services.pushdown import Pushdown
+from app.services.spill import MemoryBudget
+from app.services.response_cache import response_cache
+from app.services.task_scheduler import task_scheduler
 from sqlalchemy.orm import Session
 
+class _TableQueryError(Exception):
+    """单表查询失败，用于在并发获取中取消其余表的查询"""
+    def __init__(self, error: Dict):
+        super().__init__(error['message'])
+        self.error = error
+
+
 class APIService:
     def __init__(self):
         self.api_caller = APICaller()
@@ -13,10 +32,12 @@ class APIService:
         self,
         parsed_tables: List[Dict],
         parsed_joins: List[Dict],
-        db: Session
+        db: Session,
+        where_conditions: Optional[List] = None
     ) -> Tuple[List[Dict], Optional[Dict]]:
         """
         执行并行API调用
+        where_conditions 用于分页获取时判断何时已满足LIMIT，未提供时分页表获取全部页
         返回: (结果列表, 错误信息(如果有))
         """
         api_tasks = []
@@ -24,7 +45,7 @@ class APIService:
         # 判断是单表查询还是多表关联查询
         if len(parsed_tables) == 1:
             logger.debug(f"单表查询: {parsed_tables[0]}")
-            return await self._execute_single_table_query(parsed_tables[0], db)
+            return await self._execute_single_table_query(parsed_tables[0], db, where_conditions)
         else:
             logger.debug(f"多表查询: {parsed_tables} {parsed_joins}")
             return await self._execute_multi_table_query(parsed_tables, parsed_joins, db)
@@ -32,9 +53,15 @@ class APIService:
     async def _execute_single_table_query(
         self,
         table_info: Dict,
-        db: Session
+        db: Session,
+        where_conditions: Optional[List] = None
     ) -> Tuple[List[Dict], Optional[Dict]]:
-        """处理单表查询"""
+        """
+        处理单表查询
+        映射声明了分页方式时逐页获取，LIMIT/OFFSET不再传给上游，而是记录在结果中由合并时截取；
+        映射声明了可下推的过滤和排序时，对应条件作为请求参数传给上游，并记录在结果中不再本地计算；
+        映射声明了列类型时，数据在此按列类型转换一次，列类型记录在结果中供合并时排序和比较
+        """
         try:
             # 获取API映射
             api_mapping = await self.get_api_mapping(db, table_info['table'])
@@ -44,12 +71,39 @@ class APIService:
                     'message': f"未找到表 {table_info['table']} 的API映射"
                 }
 
+            options = api_mapping.get_options()
+            pagination = Pagination.from_options(options)
+            pushdown = Pushdown.from_options(options)
+            sql_limit = sql_offset = None
+
+            # 条件下推（仅单表查询），多个请求的结果拼接后顺序无法保证，此时不下推排序
+            pushed_params, pushed = {}, []
+            if pushdown is not None and where_conditions is not None:
+                pushed_params, pushed = pushdown.plan(
+                    table_info['alias'], where_conditions, sortable=len(table_info['request']) == 1
+                )
+                if pushed:
+                    logger.debug(f"表 {table_info['table']} 下推条件: {pushed_params}")
+            local_conditions = (
+                [condition for condition in where_conditions if condition not in pushed]
+                if where_conditions is not None else None
+            )
+
             # 准备API调用参数
-            results = []
+            calls = []
             for param in table_info['request']:
                 # 处理limit和offset
                 limit = param.pop('limit', None)
                 offset = param.pop('offset', None)
+                param = {**param, **pushed_params}
+
+                if pagination is not None:
+                    sql_limit, sql_offset = limit, offset
+                    row_budget = self._row_budget(limit, offset, local_conditions)
+                    calls.append(partial(
+                        self._fetch_pages, api_mapping, pagination, param, row_budget, local_conditions
+                    ))
+                    continue
                 
                 template = api_mapping.get_template_json()
                 if limit is not None:
@@ -57,20 +111,37 @@ class APIService:
                 if offset is not None:
                     template['offset'] = offset
 
-                # 执行API调用
-                response = await self.api_caller.call_api_async(
+                calls.append(self._make_api_call(
+                    api_mapping,
                     {
                         'method': api_mapping.method,
                         'url': api_mapping.api_url,
                         'template': template
                     },
                     param
-                )
-                
+                ))
+
+            # 并发执行API调用，结果顺序与请求顺序一致
+            responses = await task_scheduler.run_all(calls, settings.API_QUERY_CONCURRENCY)
+
+            results = []
+            for response in responses:
                 response_data = response.get('data', []) if isinstance(response, dict) else response
                 results.extend(response_data)
 
-            return [{'table': table_info['table'], 'data': results}], None
+            result = {'table': table_info['table'], 'data': results}
+            schema = ColumnSchema.for_mapping(api_mapping, results)
+            if schema is not None:
+                failed = schema.coerce_rows(results)
+                if failed:
+                    logger.warning(f"表 {table_info['table']} 有 {failed} 个值无法按列类型转换，保留原值")
+                result['schema'] = schema
+            if sql_limit is not None:
+                result['limit'] = int(sql_limit)
+                result['offset'] = int(sql_offset or 0)
+            if pushed:
+                result['pushed_conditions'] = pushed
+            return [result], None
 
         except Exception as e:
             logger.error(f"单表查询执行失败: {str(e)}", exc_info=True)
@@ -79,6 +150,67 @@ class APIService:
                 'message': f"API调用异常: {str(e)}"
             }
 
+    @staticmethod
+    def _row_budget(limit: Any, offset: Any, where_conditions: Optional[List]) -> Optional[int]:
+        """
+        分页获取时需要的行数（经本地条件过滤后），None表示需要获取全部页：
+        没有LIMIT、未提供查询条件（多表关联）或有本地计算的ORDER BY（需要全部数据排序）时不提前结束
+        """
+        if limit is None or where_conditions is None:
+            return None
+        if any(condition.operator.upper() == 'ORDER BY' for condition in where_conditions):
+            return None
+        return int(limit) + int(offset or 0)
+
+    async def _fetch_pages(
+        self,
+        api_mapping: CachedAPIMapping,
+        pagination: Pagination,
+        param: Dict,
+        row_budget: Optional[int],
+        local_conditions: Optional[List]
+    ) -> List[Dict]:
+        """逐页调用上游，本地过滤后满足 row_budget 或到达最后一页时停止"""
+        has_filter = row_budget is not None and bool(MergeService.local_conditions(local_conditions))
+        rows = []
+        matched = 0
+        cursor = None
+        for page in range(pagination.max_pages):
+            call = self._make_api_call(
+                api_mapping,
+                {
+                    'method': api_mapping.method,
+                    'url': api_mapping.api_url,
+                    'template': api_mapping.get_template_json()
+                },
+                {**param, **pagination.page_params(page, cursor)}
+            )
+            response = await call()
+            page_rows = response.get('data', []) if isinstance(response, dict) else response
+
+            schema = ColumnSchema.for_mapping(api_mapping, page_rows) if row_budget is not None else None
+            if schema is not None:
+                # 按列类型转换后再计数，与合并时的过滤一致（转换过的值在获取完成后的转换中直接跳过）；
+                # 转换的是行的副本，不修改上游响应
+                page_rows = [dict(row) for row in page_rows]
+                schema.coerce_rows(page_rows)
+            rows.extend(page_rows)
+
+            if row_budget is not None:
+                matched += len(
+                    MergeService.filter_by_conditions(page_rows, local_conditions, schema) if has_filter else page_rows
+                )
+                if matched >= row_budget:
+                    logger.debug(f"表 {api_mapping.table_name} 已获取 {page + 1} 页，满足LIMIT，停止分页")
+                    break
+
+            cursor = pagination.next_cursor(response)
+            if pagination.is_last_page(page_rows, cursor):
+                break
+        else:
+            logger.warning(f"表 {api_mapping.table_name} 分页达到上限 {pagination.max_pages} 页，结果可能不完整")
+        return rows
+
     async def _execute_multi_table_query(
         self,
         parsed_tables: List[Dict],
@@ -87,32 +219,41 @@ class APIService:
     ) -> Tuple[List[Dict], Optional[Dict]]:
         """处理多表关联查询"""
         try:
-            # 1. 首先执行所有表的独立查询
-            table_results = {}
-            for table_info in parsed_tables:
-                results, error = await self._execute_single_table_query(table_info, db)
-                if error:
-                    return [], error
-                table_results[table_info['alias']] = results[0]['data']  # 存储每个表的查询结果
-
-            # 2. 根据JOIN条件合并数据
-            merged_results = table_results[parsed_tables[0]['alias']]  # 从第一个表开始
-            
-            for join in parsed_joins:
-                left_data = merged_results
-                right_data = table_results[join.rightTable]
-                
-                # 基于JOIN条件合并数据，使用INNER JOIN逻辑
-                new_merged_results = []
-                for left_item in left_data:
-                    for right_item in right_data:
-                        if left_item.get(join.leftColumn) == right_item.get(join.rightColumn):
-                            merged_item = {**left_item, **right_item}
-                            new_merged_results.append(merged_item)
-                
-                merged_results = new_merged_results
+            # 获取过程会从请求参数中取出limit/offset，先记录
+            first_request = parsed_tables[0]['request'][0] if parsed_tables[0]['request'] else {}
+            sql_limit = first_request.get('limit')
+            sql_offset = first_request.get('offset')
+
+            # 1. 获取各表数据：并发独立查询，或先取驱动表再按连接键查询其余表
+            if settings.JOIN_STRATEGY == 'bind':
+                table_results, error = await self._fetch_tables_bind(parsed_tables, parsed_joins, db)
+            else:
+                table_results, error = await self._fetch_tables_concurrently(parsed_tables, db)
+            if error:
+                return [], error
+
+            # 2. 根据JOIN条件哈希连接数据；各表合计行数较多时推迟到合并时与过滤、排序一起在进程池中计算
+            join = {
+                'table_results': table_results,
+                'base_alias': parsed_tables[0]['alias'],  # 从第一个表开始
+                'join_conditions': parsed_joins
+            }
+            if merge_pool.should_offload(sum(len(rows) for rows in table_results.values())):
+                result = {'table': 'merged_results', 'join': join}
+            else:
+                result = {
+                    'table': 'merged_results',
+                    'data': JoinService.join_tables(**join, budget=MemoryBudget.from_settings())
+                }
 
-            return [{'table': 'merged_results', 'data': merged_results}], None
+            # 分页获取的表没有把LIMIT传给上游，在连接后截取
+            if sql_limit is not None and await self._has_paginated_table(parsed_tables, db):
+                result['limit'] = int(sql_limit)
+                result['offset'] = int(sql_offset or 0)
+            schema = await self._merged_schema(parsed_tables, db)
+            if schema is not None:
+                result['schema'] = schema
+            return [result], None
 
         except Exception as e:
             logger.error(f"多表查询执行失败: {str(e)}", exc_info=True)
@@ -122,13 +263,228 @@ class APIService:
             }
 
 
+    async def _fetch_tables_concurrently(
+        self,
+        parsed_tables: List[Dict],
+        db: Session
+    ) -> Tuple[Dict[str, List[Dict]], Optional[Dict]]:
+        """
+        并发获取各表数据，任一表失败时取消其余表的查询
+        返回: (按别名索引的表数据, 错误信息(如果有))
+        """
+        table_results = {}
+        timings = {}
+
+        async def fetch(table_info: Dict):
+            start = time.perf_counter()
+            results, error = await self._execute_single_table_query(table_info, db)
+            timings[table_info['alias']] = time.perf_counter() - start
+            if error:
+                raise _TableQueryError(error)
+            table_results[table_info['alias']] = results[0]['data']  # 存储每个表的查询结果
+
+        error = None
+        try:
+            async with asyncio.TaskGroup() as group:
+                for table_info in parsed_tables:
+                    group.create_task(fetch(table_info))
+        except* _TableQueryError as error_group:
+            error = error_group.exceptions[0].error
+        finally:
+            logger.info("各表查询耗时: " + ", ".join(
+                f"{alias}={elapsed * 1000:.1f}ms" for alias, elapsed in timings.items()
+            ))
+
+        if error:
+            return {}, error
+        return table_results, None
+
+    async def _fetch_tables_bind(
+        self,
+        parsed_tables: List[Dict],
+        parsed_joins: List[Dict],
+        db: Session
+    ) -> Tuple[Dict[str, List[Dict]], Optional[Dict]]:
+        """
+        绑定连接（semi-join下推）：先获取驱动表，收集连接键的去重值，
+        再只按这些键查询被连接的表；无法下推的JOIN（RIGHT JOIN等）回退为完整获取
+        返回: (按别名索引的表数据, 错误信息(如果有))
+        """
+        tables_by_alias = {table_info['alias']: table_info for table_info in parsed_tables}
+        driving_table = parsed_tables[0]
+
+        results, error = await self._execute_single_table_query(driving_table, db)
+        if error:
+            return {}, error
+        table_results = {driving_table['alias']: results[0]['data']}
+
+        for sequence, conditions in JoinService.group_by_sequence(parsed_joins):
+            new_aliases = [
+                alias for alias in dict.fromkeys(
+                    alias for condition in conditions
+                    for alias in (condition.leftTable, condition.rightTable)
+                )
+                if alias not in table_results and alias in tables_by_alias
+            ]
+
+            bind_keys = None
+            if len(new_aliases) == 1 and conditions[0].joinType != 'RIGHT':
+                bind_keys = self._collect_bind_keys(conditions, new_aliases[0], table_results)
+
+            if bind_keys is None:
+                # 无法下推，完整获取新表数据
+                fetched, error = await self._fetch_tables_concurrently(
+                    [tables_by_alias[alias] for alias in new_aliases], db
+                )
+                if error:
+                    return {}, error
+                table_results.update(fetched)
+                continue
+
+            new_alias = new_aliases[0]
+            data, error = await self._execute_bind_fetch(tables_by_alias[new_alias], *bind_keys, db)
+            if error:
+                return {}, error
+            table_results[new_alias] = data
+
+        return table_results, None
+
+    @staticmethod
+    def _collect_bind_keys(
+        conditions: List,
+        new_alias: str,
+        table_results: Dict[str, List[Dict]]
+    ) -> Optional[Tuple[List[str], List[Tuple]]]:
+        """
+        从已获取的表中收集连接键的去重值
+        返回: (新表的连接字段, 键值元组列表)，连接键来自多个已获取表时返回None
+        """
+        existing_aliases = set()
+        existing_columns = []
+        new_columns = []
+        for condition in conditions:
+            if condition.leftTable == new_alias:
+                existing_aliases.add(condition.rightTable)
+                existing_columns.append(condition.rightColumn)
+                new_columns.append(condition.leftColumn)
+            else:
+                existing_aliases.add(condition.leftTable)
+                existing_columns.append(condition.leftColumn)
+                new_columns.append(condition.rightColumn)
+
+        if len(existing_aliases) != 1:
+            return None
+
+        keys = {}
+        for row in table_results[existing_aliases.pop()]:
+            key = tuple(row.get(column) for column in existing_columns)
+            if None not in key:
+                keys[key] = None
+        # 已获取的表已按列类型转换，键值还原为JSON值后才能作为请求参数
+        return new_columns, [tuple(to_json_value(value) for value in key) for key in keys]
+
+    async def _execute_bind_fetch(
+        self,
+        table_info: Dict,
+        columns: List[str],
+        keys: List[Tuple],
+        db: Session
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """按连接键查询表数据，无键时不调用上游"""
+        if not keys:
+            return [], None
+
+        api_mapping = await self.get_api_mapping(db, table_info['table'])
+        requests = self._build_bind_requests(table_info, api_mapping, columns, keys) if api_mapping else None
+        if requests is None:
+            logger.debug(f"表 {table_info['table']} 无法按连接键查询，回退为完整获取")
+            bound_table = table_info
+        else:
+            logger.debug(f"表 {table_info['table']} 按 {len(keys)} 个连接键查询，共 {len(requests)} 个请求")
+            bound_table = {**table_info, 'request': requests}
+
+        results, error = await self._execute_single_table_query(bound_table, db)
+        if error:
+            return [], error
+        return results[0]['data'], None
+
+    @staticmethod
+    def _build_bind_requests(
+        table_info: Dict,
+        api_mapping: CachedAPIMapping,
+        columns: List[str],
+        keys: List[Tuple]
+    ) -> Optional[List[Dict]]:
+        """
+        生成按连接键过滤的请求参数
+        映射在 _options.batch_params 中声明了接受列表的参数时按批携带多个键，
+        否则与IN条件一样每个键一个请求；请求数超过上限时返回None
+        """
+        options = api_mapping.get_options()
+        batch_params = options.get('batch_params', {})
+        batch_size = max(1, int(options.get('batch_size', settings.BIND_JOIN_BATCH_SIZE)))
+
+        if all(column in batch_params for column in columns):
+            key_requests = []
+            for start in range(0, len(keys), batch_size):
+                chunk = keys[start:start + batch_size]
+                key_requests.append({
+                    batch_params[column]: list(dict.fromkeys(key[index] for key in chunk))
+                    for index, column in enumerate(columns)
+                })
+        else:
+            key_requests = [dict(zip(columns, key)) for key in keys]
+
+        # 表自身的过滤条件已包含连接字段时不覆盖，避免放宽过滤
+        bound_params = set(key_requests[0])
+        base_requests = table_info['request']
+        if any(bound_params & set(base) for base in base_requests):
+            return None
+
+        requests = [{**base, **key_request} for base in base_requests for key_request in key_requests]
+        if len(requests) > settings.BIND_JOIN_MAX_REQUESTS:
+            return None
+        return requests
+
+    def _make_api_call(self, api_mapping: CachedAPIMapping, api_config: Dict, params: Dict):
+        """生成延迟执行的API调用，相同的上游请求优先使用子响应缓存"""
+        ttl = response_cache.get_ttl(api_mapping.get_options())
+        # 调用过程会修改模板，需在调用前生成key
+        cache_key = response_cache.make_key(api_mapping.id, api_config, params) if ttl > 0 else None
+
+        async def call():
+            if cache_key is not None:
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            response = await self.api_caller.call_api_async(api_config, params)
+            if cache_key is not None:
+                response_cache.set(cache_key, response, ttl)
+            return response
+
+        return call
+
+    async def _has_paginated_table(self, parsed_tables: List[Dict], db: Session) -> bool:
+        for table_info in parsed_tables:
+            api_mapping = await self.get_api_mapping(db, table_info['table'])
+            if api_mapping and Pagination.from_options(api_mapping.get_options()) is not None:
+                return True
+        return False
+
+    async def _merged_schema(self, parsed_tables: List[Dict], db: Session) -> Optional[ColumnSchema]:
+        """连接结果的列类型，同名字段与连接时一样以后加入的表为准"""
+        columns = {}
+        for table_info in parsed_tables:
+            api_mapping = await self.get_api_mapping(db, table_info['table'])
+            if api_mapping and api_mapping.column_schema is not None:
+                columns.update(api_mapping.column_schema.columns)
+        return ColumnSchema(columns) if columns else None
+
     @staticmethod
-    async def get_api_mapping(db: Session, table_name: str) -> Optional[APIMapping]:
-        """异步获取API映射"""
+    async def get_api_mapping(db: Session, table_name: str) -> Optional[CachedAPIMapping]:
+        """从进程内注册表获取API映射，不访问数据库"""
         try:
-            return db.query(APIMapping).filter(
-                APIMapping.table_name == table_name
-            ).first()
+            return await mapping_registry.get(table_name)
         except Exception as e:
             logger.error(f"获取API映射失败: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
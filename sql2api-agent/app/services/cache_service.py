@@ -1,31 +1,304 @@
-from typing import Any, Optional
-import redis
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from collections import OrderedDict
+import asyncio
+import struct
+import time
+import zlib
+import orjson
+import redis.asyncio as redis
 from app.core.config import settings
 from app.core.logger import logger
 
+# 缓存值格式：1字节头 + 8字节写入时间 + 负载，头标识负载是否经过压缩
+_RAW = b'\x00'
+_ZLIB = b'\x01'
+_STORED_AT = struct.Struct('!d')
+_HEADER_SIZE = 1 + _STORED_AT.size
+
+
+def encode_value(payload: bytes, stored_at: float, compress_threshold: int) -> bytes:
+    """为orjson序列化后的负载加上格式头和写入时间，超过阈值时zlib压缩"""
+    if 0 < compress_threshold <= len(payload):
+        return _ZLIB + _STORED_AT.pack(stored_at) + zlib.compress(payload, 1)
+    return _RAW + _STORED_AT.pack(stored_at) + payload
+
+
+def decode_entry(data: bytes) -> Tuple[bytes, float]:
+    """解析缓存值，返回 (orjson序列化的负载, 写入时间)"""
+    header = data[:1]
+    stored_at = _STORED_AT.unpack_from(data, 1)[0]
+    payload = data[_HEADER_SIZE:]
+    if header == _ZLIB:
+        return zlib.decompress(payload), stored_at
+    if header != _RAW:
+        raise ValueError(f"未知的缓存值格式: {header!r}")
+    return payload, stored_at
+
+
+class CacheStats:
+    """缓存读写计数与耗时"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.errors = 0
+        self.get_seconds = 0.0
+        self.set_seconds = 0.0
+        self.bytes_raw = 0
+        self.bytes_stored = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        gets = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / gets if gets else 0.0,
+            'sets': self.sets,
+            'errors': self.errors,
+            'avg_get_ms': self.get_seconds * 1000 / gets if gets else 0.0,
+            'avg_set_ms': self.set_seconds * 1000 / self.sets if self.sets else 0.0,
+            'compression_ratio': self.bytes_stored / self.bytes_raw if self.bytes_raw else 1.0
+        }
+
+
+class LocalCache:
+    """进程内LRU缓存，按序列化后的字节数限制内存占用"""
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (负载, 写入时间, 过期时间)
+        self._entries: "OrderedDict[str, Tuple[bytes, float, float]]" = OrderedDict()
+        self._bytes = 0
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """返回 (值, 写入时间)"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        # 每次命中重新反序列化，调用方拿到的是独立的对象
+        return orjson.loads(entry[0]), entry[1]
+
+    def set(self, key: str, payload: bytes, stored_at: float, expire: int):
+        if self.max_bytes <= 0 or len(payload) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (payload, stored_at, time.monotonic() + min(expire, self.ttl))
+        self._bytes += len(payload)
+        self.stats.sets += 1
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def get_stats(self) -> Dict[str, Any]:
+        gets = self.stats.hits + self.stats.misses
+        return {
+            'hits': self.stats.hits,
+            'misses': self.stats.misses,
+            'hit_ratio': self.stats.hits / gets if gets else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes
+        }
+
+
 class CacheService:
+    """
+    两级结果缓存：进程内LRU + Redis，相同key的并发未命中只计算一次
+    写入后 CACHE_EXPIRE 秒内为新鲜数据；之后的 CACHE_STALE_TTL 秒内直接返回旧数据并在后台刷新
+    """
+
     def __init__(self):
-        self.redis_client = redis.Redis(
+        self.pool = redis.ConnectionPool(
             host=settings.REDIS_HOST,
             port=settings.REDIS_PORT,
             db=settings.REDIS_DB,
-            decode_responses=True
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT
         )
-        self.default_expire = 300  # 5分钟默认过期时间
+        self.redis_client = redis.Redis(connection_pool=self.pool)
+        self.default_expire = settings.CACHE_EXPIRE
+        self.stale_ttl = settings.CACHE_STALE_TTL
+        self.compress_threshold = settings.CACHE_COMPRESS_THRESHOLD
+        self.local_cache = LocalCache(settings.LOCAL_CACHE_MAX_BYTES, settings.LOCAL_CACHE_TTL)
+        self.stats = CacheStats()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.coalesced = 0
+        self.stale_served = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def _hard_expire(self, expire: int = None) -> int:
+        """Redis中条目的实际过期时间：新鲜期 + 可返回旧数据的时间"""
+        return (expire or self.default_expire) + self.stale_ttl
 
-    def get(self, key: str) -> Optional[Any]:
+    def _is_stale(self, stored_at: float, expire: int = None) -> bool:
+        return time.time() - stored_at > (expire or self.default_expire)
+
+    async def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """依次查询进程内缓存和Redis，返回 (值, 写入时间)；Redis命中时回填进程内缓存"""
+        entry = self.local_cache.get(key)
+        if entry is not None:
+            return entry
+
+        start = time.perf_counter()
         try:
-            return self.redis_client.get(key)
+            # 同时取剩余TTL，进程内缓存不会比Redis中的条目存活更久
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                data, ttl = await pipe.execute()
+            if data is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            payload, stored_at = decode_entry(data)
         except Exception as e:
+            self.stats.errors += 1
             logger.error(f"Redis获取缓存失败: {str(e)}")
             return None
+        finally:
+            self.stats.get_seconds += time.perf_counter() - start
+
+        if ttl and ttl > 0:
+            self.local_cache.set(key, payload, stored_at, ttl)
+        return orjson.loads(payload), stored_at
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = await self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    async def get_fresh(self, key: str) -> Optional[Any]:
+        """只返回新鲜期内的值，不触发后台刷新"""
+        entry = await self.get_entry(key)
+        if entry is None or self._is_stale(entry[1]):
+            return None
+        return entry[0]
 
-    def set(self, key: str, value: Any, expire: int = None):
+    async def set(self, key: str, value: Any, expire: int = None):
+        payload = orjson.dumps(value, default=str)  # Decimal等按字符串写入，与接口响应一致
+        stored_at = time.time()
+        self.local_cache.set(key, payload, stored_at, self._hard_expire(expire))
+        await self._set_redis(key, payload, stored_at, expire)
+
+    async def _set_redis(self, key: str, payload: bytes, stored_at: float, expire: int = None):
+        start = time.perf_counter()
         try:
-            self.redis_client.set(
+            data = encode_value(payload, stored_at, self.compress_threshold)
+            await self.redis_client.set(
                 key,
-                value,
-                ex=expire or self.default_expire
+                data,
+                ex=self._hard_expire(expire)
             )
+            self.stats.sets += 1
+            self.stats.bytes_raw += len(payload)
+            self.stats.bytes_stored += len(data)
         except Exception as e:
-            logger.error(f"Redis设置缓存失败: {str(e)}") 
\ No newline at end of file
+            self.stats.errors += 1
+            logger.error(f"Redis设置缓存失败: {str(e)}")
+        finally:
+            self.stats.set_seconds += time.perf_counter() - start
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        expire: int = None
+    ) -> Tuple[Any, bool, bool]:
+        """
+        读取缓存，未命中时调用loader计算并写入缓存
+        同一key的并发请求等待同一次计算；loader抛出的异常会传递给所有等待者且不缓存
+        命中过期（但未超过 CACHE_STALE_TTL）的数据时直接返回，并在后台刷新一次
+
+        Returns:
+            (结果, 是否命中缓存, 是否为过期数据)
+        """
+        entry = self.local_cache.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            result = (value, True, self._is_stale(stored_at, expire))
+        else:
+            task = self._inflight.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                # 计算在独立的任务中进行，发起请求被取消时不影响其他等待者
+                task = self._start_inflight(key, self._load(key, loader, expire))
+            result = await asyncio.shield(task)
+
+        if result[2]:
+            self.stale_served += 1
+            self._schedule_refresh(key, loader, expire)
+        return result
+
+    def _start_inflight(self, key: str, coro: Awaitable) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def _schedule_refresh(self, key: str, loader: Callable[[], Awaitable[Any]], expire: int):
+        """同一key同时只有一个刷新或计算任务"""
+        if key not in self._inflight:
+            self._start_inflight(key, self._refresh(key, loader, expire))
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], expire: int) -> Tuple[Any, bool, bool]:
+        entry = await self.get_entry(key)
+        if entry is not None:
+            value, stored_at = entry
+            return value, True, self._is_stale(stored_at, expire)
+
+        return await self._compute(key, loader, expire), False, False
+
+    async def _compute(self, key: str, loader: Callable[[], Awaitable[Any]], expire: int) -> Any:
+        value = await loader()
+        # 先写进程内缓存，Redis在后台写入
+        payload = orjson.dumps(value, default=str)
+        stored_at = time.time()
+        self.local_cache.set(key, payload, stored_at, self._hard_expire(expire))
+        self._run_in_background(self._set_redis(key, payload, stored_at, expire))
+        return value
+
+    async def _refresh(self, key: str, loader: Callable[[], Awaitable[Any]], expire: int):
+        """后台刷新过期数据，失败时保留旧数据"""
+        self.refreshes += 1
+        try:
+            await self._compute(key, loader, expire)
+            logger.debug(f"后台刷新缓存完成: {key}")
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.error(f"后台刷新缓存失败: {str(e)}")
+
+    def _run_in_background(self, coro: Awaitable):
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def close(self):
+        await self.redis_client.aclose()
+        await self.pool.disconnect()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'local': self.local_cache.get_stats(),
+            'redis': self.stats.to_dict(),
+            'coalesced': self.coalesced,
+            'stale_served': self.stale_served,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors
+        }
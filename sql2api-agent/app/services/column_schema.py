@@ -0,0 +1,256 @@
+from typing import Any, Callable, Dict, List, Optional
+from datetime import date, datetime, timezone
+from decimal import Decimal, InvalidOperation
+import operator
+import re
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.mapping_registry import CachedAPIMapping
+
+COLUMN_TYPES = ('int', 'float', 'decimal', 'date', 'datetime', 'string')
+
+_INT_PATTERN = re.compile(r"[+-]?\d+")
+_FLOAT_PATTERN = re.compile(r"[+-]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?")
+_DATE_PATTERN = re.compile(r"\d{4}-\d{1,2}-\d{1,2}")
+_DATETIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?")
+
+
+def _to_int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+    return int(str(value).strip())
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return value if isinstance(value, float) else float(value)
+
+
+def _to_decimal(value: Any) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, bool):
+        raise ValueError(value)
+    try:
+        return Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(value)
+
+
+def _to_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        # 兼容月、日不补零的写法，如 2024-1-2
+        return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def _to_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    text = str(value).strip()
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    return datetime.fromisoformat(text)
+
+
+def _to_string(value: Any) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    'int': _to_int,
+    'float': _to_float,
+    'decimal': _to_decimal,
+    'date': _to_date,
+    'datetime': _to_datetime,
+    'string': _to_string
+}
+
+# 转换后值的Python类型，用于判断值是否已是该列的类型（按类型精确匹配，bool不视为int，datetime不视为date）
+_PYTHON_TYPES = {
+    'int': int,
+    'float': float,
+    'decimal': Decimal,
+    'date': date,
+    'datetime': datetime,
+    'string': str
+}
+
+def to_json_value(value: Any) -> Any:
+    """转换后的值还原为JSON值，与接口响应的序列化一致：Decimal为字符串，日期和时间为ISO格式"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+_MAX_DATETIME = datetime.max
+_MAX_AWARE_DATETIME = datetime.max.replace(tzinfo=timezone.utc)
+
+
+def _negate_datetime(value: datetime) -> Any:
+    return (_MAX_DATETIME if value.tzinfo is None else _MAX_AWARE_DATETIME) - value
+
+
+# 降序排序时可以直接取反的类型，字符串等其余类型使用 _Descending 包装
+_NEGATIONS: Dict[str, Callable[[Any], Any]] = {
+    'int': operator.neg,
+    'float': operator.neg,
+    'decimal': operator.neg,
+    'date': lambda value: -value.toordinal(),
+    'datetime': _negate_datetime
+}
+
+
+class _Descending:
+    """降序字段的排序键，比较结果取反，使升序和降序字段可以在一次排序中完成"""
+    __slots__ = ('key',)
+
+    def __init__(self, key: Any):
+        self.key = key
+
+    def __lt__(self, other: '_Descending') -> bool:
+        return other.key < self.key
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and self.key == other.key
+
+
+class ColumnSchema:
+    """
+    映射返回数据的列类型，在 _options.columns 中声明，例如:
+    {"_options": {"columns": {"id": "int", "amount": "decimal", "created": "date", "name": "string"}}}
+    声明为 "infer" 时根据首次返回的数据推断一次并缓存在映射上：
+    {"_options": {"columns": "infer"}}
+    数据在获取后按列类型转换一次，无法转换的值保留原值；
+    转换后的值参与连接，连接字段在两个表中应声明相同的类型
+    """
+
+    def __init__(self, columns: Dict[str, str]):
+        self.columns = {
+            column: column_type for column, column_type in columns.items()
+            if column_type in COLUMN_TYPES
+        }
+
+    def convert(self, column: str, value: Any) -> Any:
+        """按列类型转换单个值，无法转换时抛出 ValueError"""
+        if value is None:
+            return None
+        try:
+            return _CONVERTERS[self.columns[column]](value)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"字段 {column} 的值 {value!r} 无法转换为 {self.columns[column]}") from e
+
+    def is_typed(self, column: str, value: Any) -> bool:
+        """值是否已是该列的类型"""
+        return type(value) is _PYTHON_TYPES[self.columns[column]]
+
+    def sort_value(self, column: str, descending: bool) -> Callable[[Any], Any]:
+        """
+        字段的单值排序键函数，直接使用转换后的值：
+        升序时 NULL 最前，无法转换而保留原值的值按字符串排在最后；降序时顺序完全相反
+        """
+        column_type = self.columns[column]
+        python_type = _PYTHON_TYPES[column_type]
+        negate = _NEGATIONS.get(column_type)
+
+        def ascending_value(value):
+            if value is None:
+                return (0,)
+            if type(value) is python_type:
+                return (1, value)
+            return (2, str(value))
+
+        def descending_value(value):
+            if value is None:
+                return (2,)
+            if type(value) is python_type:
+                return (1, negate(value)) if negate is not None else (1, _Descending(value))
+            return (0, _Descending(str(value)))
+
+        return descending_value if descending else ascending_value
+
+    def coerce_rows(self, rows: List[Dict]) -> int:
+        """就地转换各行的值，返回无法转换的值的个数"""
+        failed = 0
+        converters = [
+            (column, _PYTHON_TYPES[column_type], _CONVERTERS[column_type])
+            for column, column_type in self.columns.items()
+        ]
+        for row in rows:
+            for column, python_type, converter in converters:
+                value = row.get(column)
+                # 已是该类型的值（如分页获取时已转换过）不再转换
+                if value is None or type(value) is python_type:
+                    continue
+                try:
+                    row[column] = converter(value)
+                except (TypeError, ValueError, OverflowError):
+                    failed += 1
+        return failed
+
+    @staticmethod
+    def infer(rows: List[Dict]) -> 'ColumnSchema':
+        """根据样本行推断列类型，样本中非空值类型不一致的列不推断"""
+        samples: Dict[str, List[Any]] = {}
+        for row in rows[:settings.COLUMN_SCHEMA_SAMPLE_SIZE]:
+            for column, value in row.items():
+                if value is not None:
+                    samples.setdefault(column, []).append(value)
+
+        columns = {}
+        for column, values in samples.items():
+            column_type = ColumnSchema._infer_type(values)
+            if column_type is not None:
+                columns[column] = column_type
+        return ColumnSchema(columns)
+
+    @staticmethod
+    def _infer_type(values: List[Any]) -> Optional[str]:
+        if any(isinstance(value, bool) for value in values):
+            return None
+        if all(isinstance(value, int) for value in values):
+            return 'int'
+        if all(isinstance(value, (int, float)) for value in values):
+            return 'float'
+        if not all(isinstance(value, str) for value in values):
+            return None
+        for column_type, pattern in (
+            ('int', _INT_PATTERN),
+            ('float', _FLOAT_PATTERN),
+            ('date', _DATE_PATTERN),
+            ('datetime', _DATETIME_PATTERN)
+        ):
+            if all(pattern.fullmatch(value) for value in values):
+                return column_type
+        return 'string'
+
+    @staticmethod
+    def for_mapping(api_mapping: CachedAPIMapping, rows: List[Dict]) -> Optional['ColumnSchema']:
+        """映射的列类型：声明的类型，或首次获取到数据时推断并缓存；未声明时返回None"""
+        if api_mapping.column_schema is not None:
+            return api_mapping.column_schema
+
+        declared = api_mapping.get_options().get('columns')
+        if isinstance(declared, dict):
+            api_mapping.column_schema = ColumnSchema(declared)
+        elif declared == 'infer' and rows:
+            api_mapping.column_schema = ColumnSchema.infer(rows)
+            logger.info(f"表 {api_mapping.table_name} 推断列类型: {api_mapping.column_schema.columns}")
+        return api_mapping.column_schema
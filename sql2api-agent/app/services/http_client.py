@@ -0,0 +1,112 @@
+from typing import Dict, Any, Optional
+from collections import defaultdict
+import asyncio
+import httpx
+from app.core.config import settings
+from app.core.logger import logger
+
+
+class HTTPClientManager:
+    """进程级共享的HTTP客户端，复用连接池并限制每个上游主机的并发连接数"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_in_flight: Dict[str, int] = defaultdict(int)
+        self._requests_total = 0
+        self._clients_created = 0
+
+    def _http2_enabled(self) -> bool:
+        """HTTP/2 依赖 h2 包，未安装时回退到 HTTP/1.1"""
+        if not settings.API_HTTP2:
+            return False
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            logger.warning("未安装h2，HTTP/2已禁用，回退到HTTP/1.1")
+            return False
+
+    def _create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.API_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.API_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.API_KEEPALIVE_EXPIRY
+        )
+        self._clients_created += 1
+        return httpx.AsyncClient(
+            timeout=settings.API_TIMEOUT,
+            limits=limits,
+            http2=self._http2_enabled()
+        )
+
+    async def startup(self):
+        """应用启动时创建共享客户端"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+            logger.info("共享HTTP客户端已启动")
+
+    async def shutdown(self):
+        """应用关闭时释放连接池"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("共享HTTP客户端已关闭")
+        self._client = None
+        self._host_semaphores.clear()
+
+    def get_client(self) -> httpx.AsyncClient:
+        """获取共享客户端，未通过lifespan启动时（如脚本调用）按需创建"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    def _host_key(self, url: str) -> str:
+        parsed = httpx.URL(url)
+        return f"{parsed.scheme}://{parsed.host}:{parsed.port or ''}"
+
+    def _get_host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(settings.API_MAX_CONNECTIONS_PER_HOST)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """发送请求，同一上游主机的并发数受 API_MAX_CONNECTIONS_PER_HOST 限制"""
+        host = self._host_key(url)
+        async with self._get_host_semaphore(host):
+            self._host_in_flight[host] += 1
+            self._requests_total += 1
+            try:
+                return await self.get_client().request(method, url, **kwargs)
+            finally:
+                self._host_in_flight[host] -= 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """连接池指标"""
+        connections = []
+        if self._client is not None and not self._client.is_closed:
+            pool = getattr(self._client._transport, '_pool', None)
+            connections = list(getattr(pool, 'connections', []))
+
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            'requests_total': self._requests_total,
+            'clients_created': self._clients_created,
+            'connections': len(connections),
+            'idle_connections': idle,
+            'active_connections': len(connections) - idle,
+            'in_flight_by_host': {
+                host: count for host, count in self._host_in_flight.items() if count
+            },
+            'limits': {
+                'max_connections': settings.API_MAX_CONNECTIONS,
+                'max_keepalive_connections': settings.API_MAX_KEEPALIVE_CONNECTIONS,
+                'keepalive_expiry': settings.API_KEEPALIVE_EXPIRY,
+                'max_connections_per_host': settings.API_MAX_CONNECTIONS_PER_HOST,
+                'http2': settings.API_HTTP2
+            }
+        }
+
+
+http_client_manager = HTTPClientManager()
@@ -0,0 +1,335 @@
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+from collections import defaultdict
+from itertools import chain
+from operator import itemgetter
+import heapq
+from app.core.logger import logger
+from app.models.sql_models import JoinCondition
+from app.services.row_set import MISSING, RowSet
+from app.services.spill import MemoryBudget, SpillFile
+
+JOIN_TYPES = ('INNER', 'LEFT', 'RIGHT')
+
+# 连接中间结果：各表的值元组按表加入顺序拼接，外连接未匹配的表的各列为 MISSING
+JoinedRow = Tuple[Any, ...]
+
+
+class JoinService:
+    @staticmethod
+    def hash_join(
+        left: Sequence[Any],
+        right: Sequence[Any],
+        left_key: Callable[[Any], Optional[Hashable]],
+        right_key: Callable[[Any], Optional[Hashable]],
+        join_type: str = 'INNER'
+    ) -> List[Tuple[Optional[Any], Optional[Any]]]:
+        """
+        等值哈希连接，在较小的一侧建立哈希表，用另一侧探测
+
+        Args:
+            left: 左侧行
+            right: 右侧行
+            left_key: 左侧连接键提取函数，返回None表示键含NULL、不参与匹配
+            right_key: 右侧连接键提取函数
+            join_type: INNER / LEFT / RIGHT
+
+        Returns:
+            (左行, 右行) 列表，按左侧顺序输出（与嵌套循环一致），
+            RIGHT JOIN 未匹配的右侧行追加在末尾；外连接未匹配的一侧为None
+        """
+        join_type = join_type.upper()
+        if join_type not in JOIN_TYPES:
+            raise ValueError(f"不支持的JOIN类型: {join_type}")
+
+        pairs = []
+        right_matched = [False] * len(right) if join_type == 'RIGHT' else None
+
+        if len(right) <= len(left):
+            # 在右侧建表，按左侧顺序探测
+            buckets = defaultdict(list)
+            for index, row in enumerate(right):
+                key = right_key(row)
+                if key is not None:
+                    buckets[key].append(index)
+
+            for left_row in left:
+                key = left_key(left_row)
+                matches = buckets.get(key) if key is not None else None
+                if matches:
+                    for index in matches:
+                        pairs.append((left_row, right[index]))
+                        if right_matched is not None:
+                            right_matched[index] = True
+                elif join_type == 'LEFT':
+                    pairs.append((left_row, None))
+        else:
+            # 在左侧建表，用右侧探测后按左侧顺序输出
+            buckets = defaultdict(list)
+            for index, row in enumerate(left):
+                key = left_key(row)
+                if key is not None:
+                    buckets[key].append(index)
+
+            matched = defaultdict(list)
+            for right_index, right_row in enumerate(right):
+                key = right_key(right_row)
+                if key is None:
+                    continue
+                for left_index in buckets.get(key, ()):
+                    matched[left_index].append(right_row)
+                    if right_matched is not None:
+                        right_matched[right_index] = True
+
+            for left_index, left_row in enumerate(left):
+                right_rows = matched.get(left_index)
+                if right_rows:
+                    for right_row in right_rows:
+                        pairs.append((left_row, right_row))
+                elif join_type == 'LEFT':
+                    pairs.append((left_row, None))
+
+        if right_matched is not None:
+            for index, row in enumerate(right):
+                if not right_matched[index]:
+                    pairs.append((None, row))
+
+        return pairs
+
+    @staticmethod
+    def join_tables(
+        table_results: Dict[str, List[Dict]],
+        base_alias: str,
+        join_conditions: List[JoinCondition],
+        budget: Optional[MemoryBudget] = None
+    ) -> RowSet:
+        """
+        按JOIN条件依次连接各表数据
+
+        每个sequence对应一次JOIN，同一sequence的多个条件组成多列连接键；
+        根据 leftTable/rightTable 判断哪一侧是已连接的结果、哪一侧是新加入的表。
+        各表先转换为值元组，连接过程只拼接元组，不为每个匹配构建字典；
+        两侧合计超出内存预算时改为分区连接，连接结果保存在临时文件中
+
+        Returns:
+            RowSet: 按表加入顺序合并后的行（同名字段后加入的表覆盖先加入的表）
+        """
+        base_data = table_results[base_alias]
+        base_table = RowSet(RowSet.columns_of(base_data), ())
+        aliases = [base_alias]
+        # 各表的列，以及各表的列在拼接元组中的起始位置；各表的值元组连接后即可释放，不在此保留
+        columns = {base_alias: base_table.columns}
+        indexes = {base_alias: base_table.index}
+        offsets = {base_alias: 0}
+        width = len(base_table.columns)
+        rows: Iterable[JoinedRow] = RowSet.iter_values(base_data, base_table.columns)
+        # 驱动表本身超出预算时，值元组直接写入临时文件
+        rows = SpillFile.of(rows) if budget is not None and budget.exceeded(base_data) else list(rows)
+
+        def position(alias: str, column: str) -> Optional[int]:
+            index = indexes[alias]
+            return offsets[alias] + index[column] if column in index else None
+
+        for sequence, conditions in JoinService.group_by_sequence(join_conditions):
+            joined = set(aliases)
+            new_aliases = set()
+            for condition in conditions:
+                for alias in (condition.leftTable, condition.rightTable):
+                    if alias not in joined:
+                        new_aliases.add(alias)
+
+            if len(new_aliases) > 1:
+                raise ValueError(f"JOIN条件无法确定连接顺序: {conditions}")
+
+            # 拆分为 (已连接侧 别名, 字段) 和 (新表侧 字段)
+            existing_keys = []
+            new_keys = []
+            for condition in conditions:
+                if condition.leftTable in new_aliases:
+                    existing_keys.append((condition.rightTable, condition.rightColumn))
+                    new_keys.append(condition.leftColumn)
+                else:
+                    existing_keys.append((condition.leftTable, condition.leftColumn))
+                    new_keys.append(condition.rightColumn)
+
+            existing_key = JoinService._row_key([position(alias, column) for alias, column in existing_keys])
+
+            if not new_aliases:
+                # 两侧均已连接，作为过滤条件处理
+                rows = JoinService._filter_joined_rows(
+                    rows,
+                    existing_key,
+                    JoinService._row_key([
+                        position(condition.rightTable, condition.rightColumn) for condition in conditions
+                    ])
+                )
+                continue
+
+            new_alias = new_aliases.pop()
+            if new_alias not in table_results:
+                raise ValueError(f"JOIN条件引用了未知的表: {new_alias}")
+
+            new_data = table_results[new_alias]
+            new_table = RowSet(RowSet.columns_of(new_data), ())
+            new_key = JoinService._row_key([new_table.index.get(column) for column in new_keys])
+            join_type = conditions[0].joinType
+            left_fill = (MISSING,) * width
+            right_fill = (MISSING,) * len(new_table.columns)
+            if budget is not None and budget.exceeded(rows, new_data):
+                partitions = budget.partitions(rows, new_data)
+                logger.info(f"JOIN {sequence} 超出内存预算，按 {partitions} 个分区连接")
+                left_parts = JoinService._partition(rows, existing_key, partitions)
+                # 已连接的行全部写入分区后即可释放
+                rows = None
+                right_parts = JoinService._partition(
+                    RowSet.iter_values(new_data, new_table.columns), new_key, partitions
+                )
+                rows = JoinService._join_partitions(
+                    left_parts, right_parts, existing_key, new_key, join_type, left_fill, right_fill
+                )
+            else:
+                pairs = JoinService.hash_join(
+                    rows,
+                    list(RowSet.iter_values(new_data, new_table.columns)),
+                    existing_key,
+                    new_key,
+                    join_type
+                )
+                rows = [
+                    (left if left is not None else left_fill) + (right if right is not None else right_fill)
+                    for left, right in pairs
+                ]
+            columns[new_alias] = new_table.columns
+            indexes[new_alias] = new_table.index
+            offsets[new_alias] = width
+            width += len(new_table.columns)
+            aliases.append(new_alias)
+            logger.debug(f"JOIN {sequence} ({join_type}) {new_alias}: {len(rows)} 行")
+
+        return JoinService._deduplicate_columns(rows, [columns[alias] for alias in aliases])
+
+    @staticmethod
+    def group_by_sequence(join_conditions: List[JoinCondition]) -> List[Tuple[int, List[JoinCondition]]]:
+        """按sequence分组JOIN条件，按JOIN顺序返回"""
+        groups = defaultdict(list)
+        for condition in join_conditions:
+            groups[condition.sequence].append(condition)
+        return sorted(groups.items())
+
+    @staticmethod
+    def _row_key(positions: List[Optional[int]]) -> Callable[[JoinedRow], Optional[Hashable]]:
+        """按列位置取连接键，任一字段为NULL或不存在（位置为None、值为MISSING）时返回None"""
+        if None in positions:
+            return lambda row: None
+
+        if len(positions) == 1:
+            index = positions[0]
+
+            def key(row):
+                value = row[index]
+                return None if value is MISSING else value
+            return key
+
+        def key(row):
+            values = tuple(row[index] for index in positions)
+            return None if None in values or MISSING in values else values
+        return key
+
+    @staticmethod
+    def _partition(
+        rows: Iterable[JoinedRow],
+        key: Callable[[JoinedRow], Optional[Hashable]],
+        partitions: int
+    ) -> List[SpillFile]:
+        """按连接键的哈希值把 (原顺序号, 行) 写入各分区的临时文件，键相同的行必在同一分区"""
+        parts = [SpillFile() for _ in range(partitions)]
+        for sequence, row in enumerate(rows):
+            parts[hash(key(row)) % partitions].append((sequence, row))
+        return parts
+
+    @staticmethod
+    def _join_partitions(
+        left_parts: List[SpillFile],
+        right_parts: List[SpillFile],
+        left_key: Callable[[JoinedRow], Optional[Hashable]],
+        right_key: Callable[[JoinedRow], Optional[Hashable]],
+        join_type: str,
+        left_fill: JoinedRow,
+        right_fill: JoinedRow
+    ) -> SpillFile:
+        """
+        逐个分区在内存中哈希连接，每次只加载一个分区；
+        各分区的结果按左侧原顺序归并，RIGHT JOIN 未匹配的右侧行按右侧原顺序追加在末尾，输出顺序与内存连接一致
+        """
+        item_left_key = lambda item: left_key(item[1])
+        item_right_key = lambda item: right_key(item[1])
+        matched_parts = []
+        unmatched_parts = []
+        for left_part, right_part in zip(left_parts, right_parts):
+            pairs = JoinService.hash_join(
+                list(left_part), list(right_part), item_left_key, item_right_key, join_type
+            )
+            left_part.close()
+            right_part.close()
+            matched = SpillFile()
+            unmatched = SpillFile()
+            for left, right in pairs:
+                if left is None:
+                    unmatched.append((right[0], left_fill + right[1]))
+                else:
+                    matched.append((left[0], left[1] + (right[1] if right is not None else right_fill)))
+            matched_parts.append(matched)
+            unmatched_parts.append(unmatched)
+            del pairs
+
+        first = itemgetter(0)
+        return SpillFile.of(
+            row for _, row in chain(
+                heapq.merge(*matched_parts, key=first),
+                heapq.merge(*unmatched_parts, key=first)
+            )
+        )
+
+    @staticmethod
+    def _filter_joined_rows(
+        rows: Iterable[JoinedRow],
+        left_key: Callable[[JoinedRow], Optional[Hashable]],
+        right_key: Callable[[JoinedRow], Optional[Hashable]]
+    ) -> Iterable[JoinedRow]:
+        """保留两侧连接键相等的行，临时文件中的行过滤后写入新的临时文件"""
+        filtered = (
+            row for row in rows
+            if left_key(row) is not None and left_key(row) == right_key(row)
+        )
+        return SpillFile.of(filtered) if isinstance(rows, SpillFile) else list(filtered)
+
+    @staticmethod
+    def _deduplicate_columns(rows: Iterable[JoinedRow], table_columns: List[List[str]]) -> RowSet:
+        """
+        拼接元组转换为去重后的列，同名字段取后加入的表的值；
+        后加入的表中该字段不存在（外连接未匹配或行中没有该字段）时取先加入的表的值，与 dict.update 一致
+        """
+        columns, pick, duplicates = RowSet.concat_columns(table_columns)
+        if pick is None:
+            return RowSet(columns, rows)
+
+        if len(columns) == 1:
+            # itemgetter 只有一个位置时返回单个值
+            single = pick
+            pick = lambda row: (single(row),)
+
+        fallbacks = [
+            (columns.index(column), positions) for column, positions in duplicates.items()
+        ]
+
+        def deduplicate(row):
+            values = pick(row)
+            for index, positions in fallbacks:
+                if values[index] is MISSING:
+                    value = next((row[position] for position in positions if row[position] is not MISSING), MISSING)
+                    if value is not MISSING:
+                        values = values[:index] + (value,) + values[index + 1:]
+            return values
+
+        if isinstance(rows, SpillFile):
+            return RowSet(columns, SpillFile.of(map(deduplicate, rows)))
+        return RowSet(columns, [deduplicate(row) for row in rows])
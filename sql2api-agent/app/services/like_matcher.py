@@ -0,0 +1,85 @@
+from typing import Any, Callable, List, Optional, Tuple, Union
+import re
+
+# 编译后的模式种类，除 regex 外都只需一次字符串操作
+LIKE_KINDS = ('any', 'exact', 'prefix', 'suffix', 'contains', 'regex')
+
+_ESCAPE = '\\'
+_WILDCARDS = ('%', '_')
+
+# 模式拆分结果：通配符为 '%' 或 '_'，字面量为 [文本]，以便与通配符区分
+_Token = Union[str, List[str]]
+
+
+class LikePattern:
+    """
+    编译后的SQL LIKE模式：% 匹配任意个字符，_ 匹配一个字符，\\ 转义下一个字符；不区分大小写
+    按模式形状选择最简单的匹配方式，如 abc% 为前缀匹配、%abc% 为包含匹配，其余情况编译为正则；
+    NULL不匹配任何模式，其余值按字符串匹配
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        # text 为 exact/prefix/suffix/contains 模式中的字面量（保留大小写），可用于下推到上游
+        self.kind, self.text, regex = LikePattern._compile(LikePattern._tokenize(pattern))
+        self.match = LikePattern._matcher(self.kind, self.text, regex)
+
+    @staticmethod
+    def _tokenize(pattern: str) -> List[_Token]:
+        """拆分为字面量和通配符，连续的 % 合并为一个"""
+        tokens: List[_Token] = []
+        chars = iter(pattern)
+        for char in chars:
+            if char == _ESCAPE:
+                char = next(chars, _ESCAPE)
+            elif char in _WILDCARDS:
+                if not (char == '%' and tokens and tokens[-1] == '%'):
+                    tokens.append(char)
+                continue
+            if tokens and isinstance(tokens[-1], list):
+                tokens[-1].append(char)
+            else:
+                tokens.append([char])
+        return tokens
+
+    @staticmethod
+    def _compile(tokens: List[_Token]) -> Tuple[str, Optional[str], Optional[re.Pattern]]:
+        """返回 (种类, 字面量, 正则)"""
+        literals = [''.join(token) for token in tokens if isinstance(token, list)]
+        if not tokens:
+            return 'exact', '', None
+        if tokens == ['%']:
+            return 'any', None, None
+        if '_' not in tokens and len(literals) == 1:
+            starts = tokens[0] == '%'
+            ends = tokens[-1] == '%'
+            kind = 'contains' if starts and ends else 'prefix' if ends else 'suffix' if starts else 'exact'
+            return kind, literals[0], None
+
+        parts = []
+        for token in tokens:
+            if token == '%':
+                parts.append('.*')
+            elif token == '_':
+                parts.append('.')
+            else:
+                parts.append(re.escape(''.join(token)))
+        return 'regex', None, re.compile(''.join(parts), re.IGNORECASE | re.DOTALL)
+
+    @staticmethod
+    def _matcher(kind: str, text: Optional[str], regex: Optional[re.Pattern]) -> Callable[[Any], bool]:
+        if kind == 'any':
+            return lambda value: value is not None
+        if kind == 'regex':
+            fullmatch = regex.fullmatch
+            return lambda value: value is not None and fullmatch(str(value)) is not None
+
+        # 模式只在编译时转换一次小写
+        text = text.lower()
+        if kind == 'exact':
+            return lambda value: value is not None and str(value).lower() == text
+        if kind == 'prefix':
+            return lambda value: value is not None and str(value).lower().startswith(text)
+        if kind == 'suffix':
+            return lambda value: value is not None and str(value).lower().endswith(text)
+        return lambda value: value is not None and text in str(value).lower()
@@ -0,0 +1,130 @@
+from typing import Any, Dict, List, Optional
+import asyncio
+import copy
+import time
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import SessionLocal, run_in_db_executor
+from app.db.models import APIMapping
+
+
+class CachedAPIMapping:
+    """APIMapping的内存快照，request_template只在加载时解码一次"""
+
+    def __init__(self, mapping: APIMapping):
+        self.id = mapping.id
+        self.table_name = mapping.table_name
+        self.api_url = mapping.api_url
+        self.method = mapping.method
+        self.request_template = mapping.request_template
+        self._template = mapping.get_template_json()
+        self._options = mapping.get_options()
+        # 列类型，首次获取到数据时确定（见 ColumnSchema.for_mapping），映射重新加载后重新确定
+        self.column_schema = None
+
+    def get_template_json(self) -> Dict:
+        """返回模板副本，调用方可以直接修改"""
+        return copy.deepcopy(self._template)
+
+    def get_options(self) -> Dict:
+        return self._options
+
+
+class MappingRegistry:
+    """
+    进程内APIMapping注册表
+    启动时预加载全部映射，按TTL在后台刷新，请求路径不访问数据库
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._mappings: Dict[str, CachedAPIMapping] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.reload_count = 0
+        self.reload_errors = 0
+
+    @staticmethod
+    def _load_all() -> List[CachedAPIMapping]:
+        db = SessionLocal()
+        try:
+            return [CachedAPIMapping(mapping) for mapping in db.query(APIMapping).all()]
+        finally:
+            db.close()
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def reload(self) -> int:
+        """从数据库重新加载全部映射，返回映射数量"""
+        async with self._get_lock():
+            return await self._load()
+
+    async def _ensure_loaded(self):
+        """尚未加载时加载一次：并发的首批请求中，等到锁时已由其他请求加载完成的直接返回"""
+        async with self._get_lock():
+            if self._loaded_at is None:
+                await self._load()
+
+    async def _load(self) -> int:
+        """加载全部映射，调用方需持有锁"""
+        try:
+            mappings = await run_in_db_executor(self._load_all)
+        except Exception as e:
+            self.reload_errors += 1
+            logger.error(f"加载API映射失败: {str(e)}")
+            raise
+        # 整体替换，读取方不会看到加载中的中间状态
+        self._mappings = {mapping.table_name: mapping for mapping in mappings}
+        self._loaded_at = time.monotonic()
+        self.reload_count += 1
+        logger.info(f"已加载 {len(self._mappings)} 个API映射")
+        return len(self._mappings)
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                await self.reload()
+            except Exception:
+                # 刷新失败时继续使用已加载的映射
+                pass
+
+    async def start(self):
+        """应用启动时预加载并启动后台刷新"""
+        try:
+            await self.reload()
+        except Exception:
+            logger.warning("API映射预加载失败，将在首次请求时重试")
+        if self.ttl > 0 and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def get(self, table_name: str) -> Optional[CachedAPIMapping]:
+        """获取表对应的API映射，尚未加载（如未通过lifespan启动）时先加载"""
+        if self._loaded_at is None:
+            await self._ensure_loaded()
+        return self._mappings.get(table_name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'mappings': len(self._mappings),
+            'ttl': self.ttl,
+            'age': time.monotonic() - self._loaded_at if self._loaded_at is not None else None,
+            'reload_count': self.reload_count,
+            'reload_errors': self.reload_errors
+        }
+
+
+mapping_registry = MappingRegistry(settings.MAPPING_REGISTRY_TTL)
@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import multiprocessing
+import orjson
+from app.core.config import settings
+from app.core.logger import logger
+
+
+def _warm_up():
+    """子进程预先导入合并计算用到的模块"""
+    import app.services.merge_service  # noqa: F401
+
+
+class MergePool:
+    """
+    CPU密集的合并计算（连接、过滤、排序、字段筛选）在子进程中执行，大结果集不阻塞事件循环；
+    输入行数未超过阈值的查询仍在事件循环中计算，省去进程间传输
+
+    行在进程间按JSON字节传输：序列化字典行比pickle快得多，且上游数据本身来自JSON，转换无损；
+    含日期、Decimal等JSON之外的值（按列类型转换后）时回退为pickle
+    """
+
+    def __init__(self, workers: int, min_rows: int):
+        self.workers = workers
+        self.min_rows = min_rows
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.offloaded = 0
+        self.failures = 0
+        self.in_flight = 0
+
+    def should_offload(self, row_count: int) -> bool:
+        """输入行数超过阈值且启用了进程池时在子进程中计算"""
+        return self.workers > 0 and row_count >= self.min_rows
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn 启动的子进程不继承事件循环、连接池等线程状态
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            logger.info(f"合并计算进程池已启动: {self.workers} 个进程")
+        return self._executor
+
+    async def startup(self):
+        """应用启动时创建各子进程并导入模块，避免首个大查询等待进程启动"""
+        if self.workers <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _warm_up) for _ in range(self.workers)))
+
+    async def run(self, func: Callable[..., Any], *args, fallback: Callable[[], Any]) -> Any:
+        """
+        在进程池中执行 func，子进程异常退出（如内存不足被终止）时重建进程池并改为调用 fallback 在本进程计算
+        """
+        loop = asyncio.get_running_loop()
+        self.offloaded += 1
+        self.in_flight += 1
+        try:
+            return await loop.run_in_executor(self._get_executor(), partial(func, *args))
+        except BrokenProcessPool:
+            self.failures += 1
+            logger.error("合并计算进程异常退出，重建进程池，本次在事件循环中计算")
+            self.shutdown()
+            return fallback()
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def pack_rows(rows: List[Dict]) -> Any:
+        """行列表转换为传输格式：JSON字节，无法无损转换时原样交给pickle"""
+        try:
+            # 日期时间不使用 orjson 的默认转换（会变为字符串），与其他非JSON类型一样回退为pickle
+            return orjson.dumps(rows, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return rows
+
+    @staticmethod
+    def unpack_rows(payload: Any) -> List[Dict]:
+        return orjson.loads(payload) if isinstance(payload, bytes) else payload
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'min_rows': self.min_rows,
+            'offloaded': self.offloaded,
+            'failures': self.failures,
+            'in_flight': self.in_flight
+        }
+
+
+merge_pool = MergePool(settings.MERGE_PROCESS_WORKERS, settings.MERGE_PROCESS_MIN_ROWS)
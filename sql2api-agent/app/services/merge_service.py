@@ -1,6 +1,35 @@
-from typing import Dict, List, Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from functools import partial
+from itertools import islice
+import heapq
 from app.core.logger import logger
+from app.services.column_schema import ColumnSchema
+from app.services.columnar import ColumnarEngine
+from app.services.join_service import JoinService
+from app.services.like_matcher import LikePattern
+from app.services.merge_pool import merge_pool
+from app.services.row_set import MISSING, RowSet
+from app.services.spill import MemoryBudget
 from datetime import datetime
+import operator
+
+# 本地计算的比较操作符
+_COMPARISONS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '!=': operator.ne
+}
+
+
+class DeferredJoinError(Exception):
+    """推迟到合并时计算的连接失败（见 APIService），返回与在 APIService 中连接失败时相同的错误"""
+
+    @property
+    def error(self) -> Dict:
+        return {'status': 1003, 'message': f"多表查询异常: {self}"}
+
 
 class MergeService:
     @staticmethod
@@ -15,30 +44,109 @@ class MergeService:
         Returns:
             List[Dict]: 过滤后的数据列表
         """
-        filtered_data = []
+        like_conditions = [condition for condition in where_conditions if condition.operator == 'LIKE']
+        return list(MergeService._iter_filter_by_conditions(data, like_conditions))
+
+    @staticmethod
+    def filter_by_conditions(
+        data: Iterable[Dict],
+        where_conditions: List[Any],
+        schema: Optional[ColumnSchema] = None
+    ) -> List[Dict]:
+        """根据需要本地计算的条件（LIKE及 > >= < <= !=）过滤数据"""
+        return list(MergeService._iter_filter_by_conditions(data, where_conditions, schema))
+
+    @staticmethod
+    def local_conditions(where_conditions: List[Any]) -> List[Any]:
+        """需要在本地计算的过滤条件，= 和 IN 已作为请求参数传给上游"""
+        return [
+            condition for condition in where_conditions
+            if condition.operator == 'LIKE' or condition.operator in _COMPARISONS
+        ]
+
+    @staticmethod
+    def _iter_filter_by_conditions(
+        data: Iterable[Any],
+        where_conditions: List[Any],
+        schema: Optional[ColumnSchema] = None,
+        row_set: Optional[RowSet] = None
+    ) -> Iterator[Any]:
+        """
+        所有条件先编译为判断函数，再一次遍历数据完成过滤
+        row_set 不为None时数据为该行集合的值元组，按列位置取值；行中没有的字段不参与判断
+        """
+        conditions = []
+        for condition in MergeService.local_conditions(where_conditions):
+            column = condition.column
+            if isinstance(column, str) and column.startswith('`') and column.endswith('`'):
+                column = column[1:-1]
+            predicate = MergeService._condition_predicate(column, condition, schema)
+            if row_set is None:
+                conditions.append((column, predicate))
+            elif column in row_set.index:
+                conditions.append((row_set.index[column], predicate))
+
+        if row_set is not None:
+            for values in data:
+                for position, predicate in conditions:
+                    value = values[position]
+                    if value is not MISSING and not predicate(value):
+                        break
+                else:
+                    yield values
+            return
+
         for item in data:
-            should_include = True
-            for condition in where_conditions:
-                if condition.operator != 'LIKE':
-                    continue
-                    
-                column = condition.column
-                if isinstance(column, str) and column.startswith('`') and column.endswith('`'):
-                    column = column[1:-1]
-                if column not in item:
-                    continue
-                    
-                item_value = str(item[column]).lower()
-                search_value = str(condition.value).lower()  # 转换为小写进行不区分大小写的比较
-                
-                if search_value not in item_value:
-                    should_include = False
+            for column, predicate in conditions:
+                if column in item and not predicate(item[column]):
                     break
-                    
-            if should_include:
-                filtered_data.append(item)
-                
-        return filtered_data
+            else:
+                yield item
+
+    @staticmethod
+    def _condition_predicate(
+        column: str,
+        condition: Any,
+        schema: Optional[ColumnSchema]
+    ) -> Callable[[Any], bool]:
+        """
+        单个条件的判断函数：LIKE模式只编译一次；
+        声明了类型的字段，条件值只转换一次，与已转换的字段值直接比较
+        """
+        if condition.operator == 'LIKE':
+            return LikePattern(str(condition.value)).match
+
+        comparison, value = condition.operator, condition.value
+        compare = partial(MergeService._compare, comparison=comparison, value=value)
+        if schema is None or column not in schema.columns:
+            return compare
+        try:
+            typed_value = schema.convert(column, value)
+        except ValueError:
+            return compare
+
+        compare_typed = _COMPARISONS[comparison]
+
+        def predicate(item_value):
+            if schema.is_typed(column, item_value):
+                try:
+                    return compare_typed(item_value, typed_value)
+                except TypeError:
+                    # 如带时区与不带时区的时间
+                    pass
+            return compare(item_value)
+        return predicate
+
+    @staticmethod
+    def _compare(item_value: Any, comparison: str, value: Any) -> bool:
+        """比较字段值与条件值，两者都能转换为数值时按数值比较，否则按字符串比较；NULL不满足任何比较"""
+        if item_value is None:
+            return False
+        try:
+            left, right = float(item_value), float(value)
+        except (TypeError, ValueError):
+            left, right = str(item_value), str(value)
+        return _COMPARISONS[comparison](left, right)
 
     @staticmethod
     async def merge_results(
@@ -47,95 +155,290 @@ class MergeService:
     ) -> List[Dict]:
         """
         异步合并多个表的查询结果
-        当有多个表时，将每个表的数据行进行组合
+        当有多个表时，将每个表的数据行进行组合；输入行数较多时在进程池中计算，不阻塞事件循环
+        推迟到合并时的连接失败时抛出 DeferredJoinError，调用方按多表查询异常返回
         """
-        if len(all_results) <= 1:
-            # 单表查询，保持原有逻辑
-            merged_data = []
-            for result in all_results:
-                merged_data.extend(result['data'])
-        else:
-            # 多表查询，需要进行数据行组合
-            merged_data = []
-            # 获取第一个表的数据作为基础
-            base_data = all_results[0]['data']
-            
-            # 判断是否为单表多次查询
-            is_single_table = True
-            base_table = all_results[0].get('table_name', '')
-            for result in all_results[1:]:
-                if result.get('table_name', '') != base_table:
-                    is_single_table = False
-                    break
-            
-            if is_single_table:
-                # 单表多次查询，直接合并结果
-                for result in all_results[1:]:
-                    merged_data.extend(result['data'])
-            else:
-                # 多表关联查询，需要进行数据行组合
-                for base_row in base_data:
-                    combined_row = base_row.copy()
-                    for other_result in all_results[1:]:
-                        for other_row in other_result['data']:
-                            temp_row = {**combined_row, **other_row}
-                            merged_data.append(temp_row)
-
-        # 判断是否有where中是否有like条件，如果有的话，按照like条件过滤结果数据merged_data
-        has_like_conditions = any(
-            condition.operator == 'LIKE' 
-            for condition in parsed_results['where_conditions']
-        )
-                
-        # 如果有LIKE条件，使用filter_by_like_conditions函数进行过滤
-        filtered_by_where = (
-            MergeService.filter_by_like_conditions(merged_data, parsed_results['where_conditions'])
-            if has_like_conditions
-            else merged_data
+        if not MergeService.should_offload(all_results):
+            return list(MergeService.iter_results(all_results, parsed_results))
+        packed = await merge_pool.run(
+            MergeService._merge_packed,
+            [MergeService._pack_result(result) for result in all_results],
+            parsed_results,
+            fallback=lambda: list(MergeService.iter_results(all_results, parsed_results))
         )
-        
-        merged_data = filtered_by_where
-
-        # 根据order_by条件进行排序
-        if parsed_results['where_conditions']:
-            merged_data = MergeService.sort_results(merged_data, parsed_results['where_conditions'])
-
-        # 根parsed_results中的字段筛选数据
-        filtered_data = []
-        for item in merged_data:
-            filtered_item = {}
-            for parsed_result in parsed_results['tables']:
-                # 获取需要的字段
-                result_fields = parsed_result.get('result', [])
-                # 当result_fields为空时，返回所有字段
-                if not result_fields:
-                    filtered_item = item.copy()
-                    break
-                # 否则只返回指定字段
-                for field in result_fields:
-                    if field in item:
-                        filtered_item[field] = item[field]
-            if filtered_item:
-                filtered_data.append(filtered_item)
+        return merge_pool.unpack_rows(packed)
+
+    @staticmethod
+    def should_offload(all_results: List[Dict]) -> bool:
+        """
+        是否在进程池中合并：推迟了连接的结果（连接前各表行数已超过阈值，见 APIService）一定在进程池中合并；
+        已在本进程连接好的结果直接在本进程合并，其余按行数判断
+        """
+        if any('join' in result for result in all_results):
+            return True
+        if any(isinstance(result['data'], RowSet) for result in all_results):
+            return False
+        return merge_pool.should_offload(sum(len(result['data']) for result in all_results))
+
+    @staticmethod
+    def _merge_packed(packed_results: List[Dict], parsed_results: Dict[str, Any]) -> Any:
+        """在子进程中执行：还原各结果的行，合并后按传输格式返回"""
+        all_results = [MergeService._unpack_result(result) for result in packed_results]
+        return merge_pool.pack_rows(list(MergeService.iter_results(all_results, parsed_results)))
+
+    @staticmethod
+    def _pack_result(result: Dict) -> Dict:
+        packed = dict(result)
+        if 'join' in result:
+            join = result['join']
+            packed['join'] = {
+                **join,
+                'table_results': {
+                    alias: merge_pool.pack_rows(rows) for alias, rows in join['table_results'].items()
+                }
+            }
+        else:
+            packed['data'] = merge_pool.pack_rows(result['data'])
+        return packed
+
+    @staticmethod
+    def _unpack_result(packed: Dict) -> Dict:
+        result = dict(packed)
+        if 'join' in packed:
+            join = packed['join']
+            result['join'] = {
+                **join,
+                'table_results': {
+                    alias: merge_pool.unpack_rows(rows) for alias, rows in join['table_results'].items()
+                }
+            }
+        else:
+            result['data'] = merge_pool.unpack_rows(packed['data'])
+        return result
+
+    @staticmethod
+    def _resolve_joins(all_results: List[Dict]) -> List[Dict]:
+        """推迟的连接在合并时计算，join 为 JoinService.join_tables 的参数；连接失败时抛出 DeferredJoinError"""
+        if not any('join' in result for result in all_results):
+            return all_results
+        resolved = []
+        for result in all_results:
+            if 'join' in result:
+                join = result['join']
+                result = {key: value for key, value in result.items() if key != 'join'}
+                try:
+                    result['data'] = JoinService.join_tables(**join, budget=MemoryBudget.from_settings())
+                except Exception as e:
+                    logger.error(f"多表查询执行失败: {str(e)}", exc_info=True)
+                    raise DeferredJoinError(str(e)) from e
+            resolved.append(result)
+        return resolved
+
+    @staticmethod
+    def iter_results(
+        all_results: List[Dict],
+        parsed_results: Dict[str, Any]
+    ) -> Iterator[Dict]:
+        """
+        按 合并 -> 条件过滤 -> 排序 -> 字段筛选 -> limit 的顺序逐行产出结果
+        除ORDER BY需要先收集全部行外，其余步骤均不构建中间列表
+        """
+        all_results = MergeService._resolve_joins(all_results)
+        # 已由上游处理的条件（过滤和排序）不再在本地计算
+        pushed = [condition for result in all_results for condition in result.get('pushed_conditions', ())]
+        where_conditions = [condition for condition in parsed_results['where_conditions'] if condition not in pushed]
+        rows = MergeService._iter_merged_rows(all_results)
+        # 连接结果为紧凑的行集合，字段筛选前各步骤都按列位置处理值元组
+        row_set = all_results[0]['data'] if len(all_results) == 1 and isinstance(all_results[0]['data'], RowSet) else None
+        fields = MergeService._projection_fields(parsed_results['tables'])
+        project = MergeService._projector(fields, row_set)
+        schema = MergeService._result_schema(all_results)
 
-        # 处理limit条件
+        # 处理limit条件：上游已按LIMIT/OFFSET返回时结果中不带limit，分页获取的结果在过滤后截取
         limit = None
         offset = 0
-        for parsed_result in parsed_results['tables']:
-            conditions = parsed_result.get('request', {})
-            if 'limit' in conditions:
-                limit = int(conditions['limit'])
-            if 'offset' in conditions:
-                offset = int(conditions['offset'])
+        for result in all_results:
+            if result.get('limit') is not None:
+                limit = int(result['limit'])
+                offset = int(result.get('offset', 0))
+
+        # 判断where中是否有需要本地计算的条件（LIKE、范围、不等），如果有的话，按条件过滤结果数据
+        if MergeService.local_conditions(where_conditions):
+            rows = MergeService._iter_filter_by_conditions(rows, where_conditions, schema, row_set)
+
+        # 根据order_by条件进行排序，大结果集使用列式排序，有LIMIT时只保留前 offset+limit 行；
+        # 设置了内存预算时不收集全部行：有LIMIT时逐行入堆，否则超出预算时外部归并排序
+        if any(condition.operator.upper() == 'ORDER BY' for condition in where_conditions):
+            k = offset + limit if limit is not None else None
+            if limit is not None:
+                # 字段筛选后为空的行不计入LIMIT，先去掉（只判断是否为空，字段筛选在取出前k行后进行）
+                rows = filter(MergeService._has_projected_fields(fields, row_set), rows)
+            budget = MemoryBudget.from_settings()
+            if budget is None:
+                rows = iter(MergeService._sort_rows(list(rows), where_conditions, k, schema, row_set))
+            elif k is not None:
+                rows = iter(MergeService.top_k(rows, where_conditions, k, schema, row_set))
+            else:
+                order_by = [condition for condition in where_conditions if condition.operator.upper() == 'ORDER BY']
+                rows = budget.sort(
+                    rows,
+                    MergeService._sort_key(order_by, schema, row_set),
+                    partial(MergeService._sort_rows, where_conditions=where_conditions, schema=schema, row_set=row_set)
+                )
+
+        # 根parsed_results中的字段筛选数据（连接结果在此转换为字典）
+        rows = MergeService._iter_projected_rows(rows, project)
 
         # 应用limit和offset
         if limit is not None:
-            filtered_data = filtered_data[offset:offset + limit]
+            rows = islice(rows, offset, offset + limit)
+
+        return rows
+
+    @staticmethod
+    def _iter_merged_rows(all_results: List[Dict]) -> Iterator[Dict]:
+        if len(all_results) <= 1:
+            # 单表查询，保持原有逻辑
+            for result in all_results:
+                yield from result['data']
+            return
+
+        # 多表查询，需要进行数据行组合
+        # 获取第一个表的数据作为基础
+        base_data = all_results[0]['data']
+
+        # 判断是否为单表多次查询
+        is_single_table = True
+        base_table = all_results[0].get('table_name', '')
+        for result in all_results[1:]:
+            if result.get('table_name', '') != base_table:
+                is_single_table = False
+                break
+
+        if is_single_table:
+            # 单表多次查询，直接合并结果
+            for result in all_results[1:]:
+                yield from result['data']
+        else:
+            # 多表关联查询，需要进行数据行组合
+            for base_row in base_data:
+                combined_row = base_row.copy()
+                for other_result in all_results[1:]:
+                    for other_row in other_result['data']:
+                        yield {**combined_row, **other_row}
+
+    @staticmethod
+    def _result_schema(all_results: List[Dict]) -> Optional[ColumnSchema]:
+        """各结果的列类型，没有结果声明列类型时返回None"""
+        schemas = [result['schema'] for result in all_results if result.get('schema') is not None]
+        if len(schemas) <= 1:
+            return schemas[0] if schemas else None
+        columns = {}
+        for schema in schemas:
+            columns.update(schema.columns)
+        return ColumnSchema(columns)
+
+    @staticmethod
+    def _sort_rows(
+        rows: List[Any],
+        where_conditions: List[Any],
+        k: Optional[int] = None,
+        schema: Optional[ColumnSchema] = None,
+        row_set: Optional[RowSet] = None
+    ) -> List[Any]:
+        """内存中排序：大结果集使用列式排序，k 不为None时只取前k行"""
+        if ColumnarEngine.should_use(len(rows)):
+            return MergeService._sort_columnar(rows, where_conditions, schema, row_set)
+        if k is not None:
+            return MergeService.top_k(rows, where_conditions, k, schema, row_set)
+        return MergeService.sort_results(rows, where_conditions, schema, row_set)
+
+    @staticmethod
+    def _sort_columnar(
+        rows: List[Any],
+        where_conditions: List[Any],
+        schema: Optional[ColumnSchema] = None,
+        row_set: Optional[RowSet] = None
+    ) -> List[Any]:
+        """列式排序，遇到无法列式处理的数据时回退到逐行排序"""
+        order_by = [
+            (
+                list(map(MergeService._column_getter(condition.column, row_set), rows)),
+                MergeService._column_sort_value(condition, schema)
+            )
+            for condition in where_conditions
+            if condition.operator.upper() == 'ORDER BY'
+        ]
+        ordered = ColumnarEngine.sort(rows, order_by)
+        if ordered is None:
+            logger.debug("列式排序不适用，回退到逐行排序")
+            ordered = MergeService.sort_results(rows, where_conditions, schema, row_set)
+        return ordered
+
+    @staticmethod
+    def _column_getter(column: str, row_set: Optional[RowSet]) -> Callable[[Any], Any]:
+        """取行中字段值的函数，字段不存在时返回None"""
+        if row_set is None:
+            return operator.methodcaller('get', column)
+        position = row_set.index.get(column)
+        if position is None:
+            return lambda values: None
+
+        def get(values):
+            value = values[position]
+            return None if value is MISSING else value
+        return get
 
-        return filtered_data
+    @staticmethod
+    def _projection_fields(parsed_tables: List[Dict]) -> Optional[List[str]]:
+        """需要返回的字段，任一表的result_fields为空时返回None，表示返回所有字段"""
+        fields = []
+        for parsed_result in parsed_tables:
+            result_fields = parsed_result.get('result', [])
+            if not result_fields:
+                return None
+            fields.extend(result_fields)
+        return list(dict.fromkeys(fields))
+
+    @staticmethod
+    def _project(item: Dict, fields: Optional[List[str]]) -> Dict:
+        if fields is None:
+            return item.copy()
+        # 只返回指定字段
+        return {field: item[field] for field in fields if field in item}
+
+    @staticmethod
+    def _projector(fields: Optional[List[str]], row_set: Optional[RowSet]) -> Callable[[Any], Dict]:
+        """字段筛选函数，行集合的值元组在此转换为字典"""
+        if row_set is None:
+            return partial(MergeService._project, fields=fields)
+        return partial(row_set.project, fields=row_set.positions(fields))
+
+    @staticmethod
+    def _has_projected_fields(fields: Optional[List[str]], row_set: Optional[RowSet]) -> Callable[[Any], bool]:
+        """行在字段筛选后是否非空，不构建筛选后的字典"""
+        if row_set is None:
+            if fields is None:
+                return bool
+            return lambda item: any(field in item for field in fields)
+        # 行集合中没有的字段输出为None，筛选后是否为空只取决于筛选的字段是否为结果中的列
+        has_fields = bool(row_set.positions(fields) if fields is not None else row_set.columns)
+        return lambda values: has_fields
 
     @staticmethod
-    def sort_results(data: List[Dict], where_conditions: List[Dict]) -> List[Dict]:
+    def _iter_projected_rows(rows: Iterable[Any], project: Callable[[Any], Dict]) -> Iterator[Dict]:
+        for item in rows:
+            filtered_item = project(item)
+            if filtered_item:
+                yield filtered_item
+
+    @staticmethod
+    def sort_results(
+        data: List[Dict],
+        where_conditions: List[Dict],
+        schema: Optional[ColumnSchema] = None,
+        row_set: Optional[RowSet] = None
+    ) -> List[Dict]:
         """根据order_by条件对结果进行排序"""
         if not data or not where_conditions:
             return data
@@ -149,37 +452,90 @@ class MergeService:
         # 如果没有排序条件，直接返回原数据
         if not order_by:
             return data
-            
+        
+        try:
+            return sorted(data, key=MergeService._sort_key(order_by, schema, row_set))
+        except TypeError:
+            if schema is None:
+                raise
+            logger.debug("按列类型排序失败，回退到按值推断类型排序")
+            return sorted(data, key=MergeService._sort_key(order_by, None, row_set))
+
+    @staticmethod
+    def top_k(
+        data: Iterable[Any],
+        where_conditions: List[Any],
+        k: int,
+        schema: Optional[ColumnSchema] = None,
+        row_set: Optional[RowSet] = None
+    ) -> List[Dict]:
+        """
+        ORDER BY ... LIMIT 时只取排序后的前k行，用大小为k的堆代替全量排序
+        排序键相同的行保持原顺序，结果与 sort_results 的前k行一致；data 可以是逐行产出的迭代器
+        """
+        order_by = [
+            condition for condition in where_conditions
+            if condition.operator.upper() == 'ORDER BY'
+        ]
+        try:
+            return heapq.nsmallest(k, data, key=MergeService._sort_key(order_by, schema, row_set))
+        except TypeError:
+            # 迭代器已部分读取，无法重新排序
+            if schema is None or not isinstance(data, list):
+                raise
+            logger.debug("按列类型排序失败，回退到按值推断类型排序")
+            return heapq.nsmallest(k, data, key=MergeService._sort_key(order_by, None, row_set))
+
+    @staticmethod
+    def _sort_key(
+        order_by: List[Any],
+        schema: Optional[ColumnSchema] = None,
+        row_set: Optional[RowSet] = None
+    ) -> Callable[[Any], List[Any]]:
+        columns = [
+            (
+                MergeService._column_getter(sort_condition.column, row_set),
+                MergeService._column_sort_value(sort_condition, schema)
+            )
+            for sort_condition in order_by
+        ]
+
         def get_sort_key(item):
-            keys = []
-            for sort_condition in order_by:
-                column = sort_condition.column
-                value = item.get(column, None)
-                
-                # 处理字符串类型的值
-                if isinstance(value, str):
-                    # 尝试转换为日期
-                    try:
-                        value = datetime.strptime(value, '%Y-%m-%d')
-                    except (ValueError, TypeError):
-                        # 如果不是日期，尝试转换为数值
-                        try:
-                            value = float(value)
-                        except (ValueError, TypeError):
-                            # 如果既不是日期也不是数值，使用字符串的ASCII码
-                            value = ord(value[0]) if value else 0
-                
-                # 处理降序
-                if sort_condition.value == 'DESC':
-                    if isinstance(value, datetime):
-                        # 对于日期类型，使用一个足够大的未来日期减去当前日期
-                        max_date = datetime(9999, 12, 31)
-                        value = max_date - value
-                    elif isinstance(value, (int, float)):
-                        value = -value
-                    elif isinstance(value, str):
-                        value = -ord(value[0]) if value else 0
-                keys.append(value)
-            return keys
+            return [sort_value(get(item)) for get, sort_value in columns]
+        return get_sort_key
+
+    @staticmethod
+    def _column_sort_value(sort_condition: Any, schema: Optional[ColumnSchema]) -> Callable[[Any], Any]:
+        """排序字段的单值排序键函数，声明了类型的字段直接使用转换后的值"""
+        descending = sort_condition.value == 'DESC'
+        if schema is not None and sort_condition.column in schema.columns:
+            return schema.sort_value(sort_condition.column, descending)
+        return partial(MergeService._sort_value, descending=descending)
+
+    @staticmethod
+    def _sort_value(value: Any, descending: bool) -> Any:
+        """单个字段值的排序键"""
+        # 处理字符串类型的值
+        if isinstance(value, str):
+            # 尝试转换为日期
+            try:
+                value = datetime.strptime(value, '%Y-%m-%d')
+            except (ValueError, TypeError):
+                # 如果不是日期，尝试转换为数值
+                try:
+                    value = float(value)
+                except (ValueError, TypeError):
+                    # 如果既不是日期也不是数值，使用字符串的ASCII码
+                    value = ord(value[0]) if value else 0
         
-        return sorted(data, key=get_sort_key) 
\ No newline at end of file
+        # 处理降序
+        if descending:
+            if isinstance(value, datetime):
+                # 对于日期类型，使用一个足够大的未来日期减去当前日期
+                max_date = datetime(9999, 12, 31)
+                value = max_date - value
+            elif isinstance(value, (int, float)):
+                value = -value
+            elif isinstance(value, str):
+                value = -ord(value[0]) if value else 0
+        return value 
\ No newline at end of file
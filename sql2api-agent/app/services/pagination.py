@@ -0,0 +1,65 @@
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+PAGINATION_STYLES = ('offset', 'page', 'cursor')
+
+
+class Pagination:
+    """
+    上游API的分页方式，在映射的 _options.pagination 中声明，例如:
+    {"_options": {"pagination": {"style": "offset", "page_size": 200}}}
+    {"_options": {"pagination": {"style": "page", "page_param": "pageNo", "size_param": "pageSize", "start_page": 1}}}
+    {"_options": {"pagination": {"style": "cursor", "cursor_param": "cursor", "cursor_field": "next_cursor"}}}
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.style = config.get('style', 'offset')
+        if self.style not in PAGINATION_STYLES:
+            raise ValueError(f"不支持的分页方式: {self.style}")
+        self.page_size = max(1, int(config.get('page_size', settings.PAGINATION_PAGE_SIZE)))
+        self.max_pages = max(1, int(config.get('max_pages', settings.PAGINATION_MAX_PAGES)))
+        # offset: 偏移量和每页条数参数
+        self.limit_param = config.get('limit_param', 'limit')
+        self.offset_param = config.get('offset_param', 'offset')
+        # page: 页码和每页条数参数
+        self.page_param = config.get('page_param', 'page')
+        self.size_param = config.get('size_param', 'page_size')
+        self.start_page = int(config.get('start_page', 1))
+        # cursor: 请求参数和响应中下一页游标的字段
+        self.cursor_param = config.get('cursor_param', 'cursor')
+        self.cursor_field = config.get('cursor_field', 'next_cursor')
+
+    @staticmethod
+    def from_options(options: Dict[str, Any]) -> Optional['Pagination']:
+        """映射未声明分页时返回None"""
+        config = options.get('pagination')
+        if not isinstance(config, dict):
+            return None
+        return Pagination(config)
+
+    def page_params(self, page: int, cursor: Any = None) -> Dict[str, Any]:
+        """第page页（从0开始）的请求参数"""
+        if self.style == 'offset':
+            return {self.limit_param: self.page_size, self.offset_param: page * self.page_size}
+        if self.style == 'page':
+            return {self.page_param: self.start_page + page, self.size_param: self.page_size}
+        params = {self.size_param: self.page_size}
+        if cursor is not None:
+            params[self.cursor_param] = cursor
+        return params
+
+    def next_cursor(self, response: Any) -> Any:
+        """从响应中取下一页游标，支持 a.b 形式的嵌套字段"""
+        value = response
+        for part in self.cursor_field.split('.'):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value or None
+
+    def is_last_page(self, rows: List[Dict], cursor: Any) -> bool:
+        if not rows:
+            return True
+        if self.style == 'cursor':
+            return cursor is None
+        return len(rows) < self.page_size
@@ -0,0 +1,117 @@
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+import copy
+import re
+import threading
+from app.core.config import settings
+
+# 字符串字面量原样保留，其余连续空白折叠为一个空格
+_WHITESPACE_PATTERN = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")|\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """规范化SQL文本，用作计划缓存的key"""
+    return _WHITESPACE_PATTERN.sub(lambda m: m.group(1) or ' ', sql).strip().rstrip(';').strip()
+
+
+def _condition_key(condition) -> tuple:
+    value = condition.value
+    return (condition.table, condition.column, condition.operator, tuple(value) if isinstance(value, list) else value)
+
+
+def canonical_plan(parsed_results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    解析结果的规范形式，用作结果缓存的key
+    AND连接的条件和IN列表的值排序后比较（IN列表不去重：每个值一个上游请求，重复的值返回重复的行）；
+    SELECT字段和ORDER BY保持原顺序；
+    有LIMIT/OFFSET但没有ORDER BY时，条件顺序决定返回哪些行，此时不排序
+    """
+    conditions = parsed_results['where_conditions']
+    order_by = [c for c in conditions if c.operator.upper() == 'ORDER BY']
+    filters = [c for c in conditions if c.operator.upper() != 'ORDER BY']
+    has_limit = any(c.operator == '=' and c.table == '' and c.column in ('limit', 'offset') for c in filters)
+    reorderable = bool(order_by) or not has_limit
+
+    filter_keys = []
+    for condition in filters:
+        key = _condition_key(condition)
+        if reorderable and condition.operator == 'IN':
+            key = key[:3] + (tuple(sorted(key[3], key=repr)),)
+        filter_keys.append(key)
+    if reorderable:
+        filter_keys.sort(key=repr)
+
+    joins = []
+    for condition in parsed_results['join_conditions']:
+        # a = b 与 b = a 等价
+        sides = sorted([(condition.leftTable, condition.leftColumn), (condition.rightTable, condition.rightColumn)])
+        joins.append((condition.sequence, condition.joinType, sides))
+    joins.sort(key=repr)
+
+    return {
+        'tables': [(table['table'], table['alias'], table['result']) for table in parsed_results['tables']],
+        'filters': filter_keys,
+        'order_by': [(c.table, c.column, c.value) for c in order_by],
+        'joins': joins
+    }
+
+
+class PlanCache:
+    """线程安全的有界LRU缓存，缓存SQL解析结果"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._plans: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """命中时返回深拷贝，调用方修改结果不会影响缓存"""
+        plan = self.peek(key)
+        self.record(plan is not None)
+        return plan
+
+    def peek(self, key: str) -> Optional[Any]:
+        """与 get 相同但不计入命中率，一次解析查找多个key时由调用方用 record 只记录一次"""
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                return None
+            self._plans.move_to_end(key)
+        return copy.deepcopy(plan)
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def set(self, key: str, plan: Any):
+        if self.max_size <= 0:
+            return
+        plan = copy.deepcopy(plan)
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._plans),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+
+plan_cache = PlanCache(settings.PLAN_CACHE_SIZE)
@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.sql_models import WhereCondition
+from app.services.like_matcher import LikePattern
+
+# 可下推的条件操作符
+PUSHDOWN_OPERATORS = ('>', '>=', '<', '<=', '!=', 'LIKE')
+
+# 上游可处理的LIKE匹配方式（filters中声明的键）与对应的模式种类，参数值为去掉通配符的关键字
+LIKE_PUSHDOWN_KINDS = {'LIKE': 'contains', 'PREFIX': 'prefix'}
+
+
+class Pushdown:
+    """
+    上游API可处理的过滤和排序，在映射的 _options 中声明，例如:
+    {"_options": {
+        "filters": {"amount": {">=": "min_amount", "<=": "max_amount"}, "name": {"LIKE": "keyword", "PREFIX": "name_prefix"}},
+        "sort": {"param": "sort", "columns": ["id", "amount"], "format": "{column} {direction}"}
+    }}
+    filters 按 字段 -> 操作符 -> 请求参数名 声明，LIKE 表示上游按包含匹配（只下推 %关键字% 形式的模式），
+    PREFIX 表示上游按前缀匹配（只下推 关键字% 形式的模式），其余形式的LIKE在本地计算；sort 声明排序参数、可排序字段和参数值格式，
+    多个排序字段的参数值以逗号连接
+    """
+
+    def __init__(self, filters: Dict[str, Dict[str, str]], sort: Optional[Dict[str, Any]]):
+        self.filters = {
+            column: {operator.upper(): param for operator, param in operators.items()}
+            for column, operators in filters.items()
+            if isinstance(operators, dict)
+        }
+        self.sort = sort if isinstance(sort, dict) and sort.get('param') else None
+
+    @staticmethod
+    def from_options(options: Dict[str, Any]) -> Optional['Pushdown']:
+        """映射未声明任何下推能力时返回None"""
+        filters = options.get('filters')
+        sort = options.get('sort')
+        if not isinstance(filters, dict) and not isinstance(sort, dict):
+            return None
+        return Pushdown(filters if isinstance(filters, dict) else {}, sort)
+
+    def plan(
+        self,
+        alias: str,
+        where_conditions: List[WhereCondition],
+        sortable: bool
+    ) -> Tuple[Dict[str, Any], List[WhereCondition]]:
+        """
+        选出可由上游处理的条件
+        sortable 为False时（结果由多个请求拼接）不下推排序
+
+        Returns:
+            (附加到每个请求的参数, 已下推的条件)，已下推的条件不再在本地计算
+        """
+        params = {}
+        pushed = []
+        for condition in where_conditions:
+            if condition.operator not in PUSHDOWN_OPERATORS:
+                continue
+            if condition.table not in ('', alias):
+                continue
+            param, value = self._filter_param(condition)
+            # 同一参数只能携带一个值，重复条件留在本地计算
+            if param is None or param in params:
+                continue
+            params[param] = value
+            pushed.append(condition)
+
+        order_by = [condition for condition in where_conditions if condition.operator.upper() == 'ORDER BY']
+        if sortable and order_by and self.sort is not None:
+            columns = self.sort.get('columns', [])
+            if all(condition.table in ('', alias) and condition.column in columns for condition in order_by):
+                value_format = self.sort.get('format', '{column} {direction}')
+                params[self.sort['param']] = ','.join(
+                    value_format.format(column=condition.column, direction=str(condition.value).upper())
+                    for condition in order_by
+                )
+                pushed.extend(order_by)
+
+        return params, pushed
+
+    def _filter_param(self, condition: WhereCondition) -> Tuple[Optional[str], Any]:
+        """条件对应的 (请求参数名, 参数值)，无法下推时参数名为None"""
+        operators = self.filters.get(condition.column, {})
+        if condition.operator != 'LIKE':
+            return operators.get(condition.operator), condition.value
+
+        pattern = LikePattern(str(condition.value))
+        for operator, kind in LIKE_PUSHDOWN_KINDS.items():
+            if pattern.kind == kind and operator in operators:
+                return operators[operator], pattern.text
+        return None, None
@@ -0,0 +1,47 @@
+from typing import Any, Dict, Optional
+import time
+import orjson
+from app.core.config import settings
+from app.services.api_caller import request_key
+from app.services.cache_service import LocalCache
+
+
+class ResponseCache:
+    """
+    上游子响应缓存，按 (映射id, 请求) 缓存API响应，不同SQL产生的相同上游请求可复用
+    映射可在 _options.cache_ttl 中声明自己的缓存时间(秒)，0表示不缓存
+    """
+
+    def __init__(self, max_bytes: int, default_ttl: int):
+        self.default_ttl = default_ttl
+        # 单个映射的TTL可以大于默认值，进程内缓存本身不再限制
+        self._cache = LocalCache(max_bytes, ttl=2 ** 31)
+
+    def get_ttl(self, options: Dict) -> int:
+        ttl = options.get('cache_ttl', self.default_ttl)
+        try:
+            return max(0, int(ttl))
+        except (TypeError, ValueError):
+            return self.default_ttl
+
+    @staticmethod
+    def make_key(mapping_id: Any, api_config: Dict, params: Dict) -> str:
+        return f"{mapping_id}:{request_key(api_config, params)}"
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._cache.get(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key: str, response: Any, ttl: int):
+        if ttl <= 0:
+            return
+        # Decimal等按字符串写入，与结果缓存一致；读取后按列类型重新转换
+        self._cache.set(key, orjson.dumps(response, default=str), time.time(), ttl)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self._cache.get_stats()
+        stats['default_ttl'] = self.default_ttl
+        return stats
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_TTL)
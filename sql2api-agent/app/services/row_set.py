@@ -0,0 +1,100 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from operator import itemgetter
+
+
+class _Missing:
+    """行中没有该字段（区别于值为NULL）"""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return 'MISSING'
+
+    def __reduce__(self) -> str:
+        # 从临时文件读回时仍为同一个对象，可以用 is 判断
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+class RowSet:
+    """
+    紧凑的行集合：列名和列位置只保存一份，每行为按列顺序排列的值元组，行中没有的字段为 MISSING（输出时为None）
+    连接结果使用该格式，过滤、排序按列位置取值，字段筛选时才转换为字典；
+    超出内存预算的连接结果保存在临时文件中（rows 为 SpillFile），只能顺序读取
+    """
+    __slots__ = ('columns', 'index', 'rows')
+
+    def __init__(self, columns: List[str], rows: Iterable[Tuple]):
+        self.columns = columns
+        self.index = {column: position for position, column in enumerate(columns)}
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    @staticmethod
+    def from_dicts(data: List[Dict]) -> 'RowSet':
+        """由字典行构建，列为各行字段的并集（按首次出现的顺序）"""
+        columns = RowSet.columns_of(data)
+        return RowSet(columns, list(RowSet.iter_values(data, columns)))
+
+    @staticmethod
+    def columns_of(data: List[Dict]) -> List[str]:
+        return list(dict.fromkeys(column for row in data for column in row))
+
+    @staticmethod
+    def iter_values(data: Iterable[Dict], columns: List[str]) -> Iterator[Tuple]:
+        """逐行转换为值元组，字段与列顺序一致的行（常见情况）直接取值"""
+        expected = tuple(columns)
+        for row in data:
+            if tuple(row) == expected:
+                yield tuple(row.values())
+            else:
+                yield tuple(row.get(column, MISSING) for column in columns)
+
+    @staticmethod
+    def concat_columns(parts: List[List[str]]) -> Tuple[List[str], Optional[itemgetter], Dict[str, List[int]]]:
+        """
+        多个表的行按顺序拼接后的列：同名字段以后加入的表为准（与 dict.update 一致）
+        Returns:
+            (去重后的列, 从拼接后的元组中取各列的itemgetter（无重名字段时为None）, 重名字段在拼接元组中的位置（从后往前）)
+        """
+        flat = [column for columns in parts for column in columns]
+        last = {column: position for position, column in enumerate(flat)}
+        if len(last) == len(flat):
+            return flat, None, {}
+        columns = list(last)
+        duplicates = {}
+        for position in range(len(flat) - 1, -1, -1):
+            column = flat[position]
+            if flat.count(column) > 1:
+                duplicates.setdefault(column, []).append(position)
+        return columns, itemgetter(*[last[column] for column in columns]), duplicates
+
+    def project(self, values: Tuple, fields: Optional[List[Tuple[str, int]]]) -> Dict:
+        """
+        转换为字典（只在输出时调用），fields 为 (字段, 列位置) 列表，None表示所有字段；
+        行中没有的字段（如外连接未匹配的表的各列）输出为None，同一结果中各行的字段相同
+        """
+        if fields is None:
+            row = dict(zip(self.columns, values))
+        else:
+            row = {field: values[position] for field, position in fields}
+        if MISSING in values:
+            for field, value in row.items():
+                if value is MISSING:
+                    row[field] = None
+        return row
+
+    def positions(self, fields: Optional[List[str]]) -> Optional[List[Tuple[str, int]]]:
+        """字段筛选对应的列位置，结果中没有的字段忽略"""
+        if fields is None:
+            return None
+        return [(field, self.index[field]) for field in fields if field in self.index]
+
+    def to_dicts(self) -> List[Dict]:
+        return [self.project(values, None) for values in self.rows]
@@ -0,0 +1,143 @@
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+from itertools import islice
+import heapq
+import pickle
+import sys
+import tempfile
+from app.core.config import settings
+from app.core.logger import logger
+
+# 估算每行大小的抽样行数
+_SAMPLE_ROWS = 100
+# 临时文件中每批序列化的行数（归并时每个文件各读入一批），也是外部排序每段的最小行数（限制归并时同时打开的文件数）
+_BATCH_ROWS = 256
+# 分区连接的最大分区数
+_MAX_PARTITIONS = 128
+
+
+def _row_bytes(row: Any) -> int:
+    """单行的近似内存占用：行对象本身加各字段值（不计共享的字段名）"""
+    values = row.values() if isinstance(row, dict) else row
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+
+
+class SpillFile:
+    """
+    临时文件中的行序列，按批序列化追加写入，可多次顺序读取（多个读取互不影响）
+    文件没有名字，对象回收或 close 后由系统删除
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(dir=settings.SPILL_DIR or None)
+        self._buffer: List[Any] = []
+        self._size = 0
+        self.count = 0
+
+    @staticmethod
+    def of(rows: Iterable[Any]) -> 'SpillFile':
+        spill_file = SpillFile()
+        spill_file.extend(rows)
+        return spill_file
+
+    def append(self, row: Any):
+        self._buffer.append(row)
+        self.count += 1
+        if len(self._buffer) >= _BATCH_ROWS:
+            self._flush()
+
+    def extend(self, rows: Iterable[Any]):
+        for row in rows:
+            self.append(row)
+
+    def _flush(self):
+        if self._buffer:
+            self._file.seek(self._size)
+            pickle.dump(self._buffer, self._file, pickle.HIGHEST_PROTOCOL)
+            self._size = self._file.tell()
+            self._buffer = []
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Any]:
+        self._flush()
+        return self._read(self._size)
+
+    def _read(self, end: int) -> Iterator[Any]:
+        position = 0
+        while position < end:
+            self._file.seek(position)
+            batch = pickle.load(self._file)
+            position = self._file.tell()
+            yield from batch
+
+    def close(self):
+        self._file.close()
+
+
+class MemoryBudget:
+    """
+    单次查询连接和排序阶段的内存预算（字节），按抽样估算的每行大小判断是否超出；
+    超出时哈希连接按连接键分区写入临时文件后逐个分区连接，ORDER BY 改为外部归并排序
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+
+    @staticmethod
+    def from_settings() -> Optional['MemoryBudget']:
+        """未配置预算时返回None"""
+        if settings.QUERY_MEMORY_BUDGET <= 0:
+            return None
+        return MemoryBudget(settings.QUERY_MEMORY_BUDGET)
+
+    @staticmethod
+    def estimate(rows: Iterable[Any], count: int) -> int:
+        """按前若干行估算 count 行的字节数"""
+        sample = rows[:_SAMPLE_ROWS] if isinstance(rows, list) else list(islice(rows, _SAMPLE_ROWS))
+        if not sample:
+            return 0
+        return sum(map(_row_bytes, sample)) * count // len(sample)
+
+    def exceeded(self, *tables: Iterable[Any]) -> bool:
+        """多个表（列表或临时文件）合计是否超出预算，已写入临时文件的表视为超出"""
+        if any(isinstance(table, SpillFile) for table in tables):
+            return True
+        return sum(self.estimate(table, len(table)) for table in tables) > self.limit
+
+    def partitions(self, *tables: Iterable[Any]) -> int:
+        """分区连接的分区数，使每个分区约为预算的一半"""
+        total = sum(self.estimate(table, len(table)) for table in tables)
+        return max(2, min(_MAX_PARTITIONS, -(-2 * total // self.limit)))
+
+    def sort(
+        self,
+        rows: Iterable[Any],
+        key: Callable[[Any], Any],
+        sort_in_memory: Callable[[List[Any]], List[Any]]
+    ) -> Iterator[Any]:
+        """
+        排序：全部行在预算内时交给 sort_in_memory；
+        否则按预算分段排序，各段（最后一段除外）写入临时文件，再按 key 多路归并；
+        各段按输入顺序归并，键相同的行保持原顺序，结果与整体稳定排序一致
+        """
+        rows = iter(rows)
+        chunk = list(islice(rows, _SAMPLE_ROWS))
+        if not chunk:
+            return iter(chunk)
+        max_rows = max(_BATCH_ROWS, self.limit * len(chunk) // max(1, sum(map(_row_bytes, chunk))))
+
+        runs = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= max_rows:
+                chunk.sort(key=key)
+                runs.append(SpillFile.of(chunk))
+                chunk = []
+
+        if not runs:
+            return iter(sort_in_memory(chunk))
+
+        chunk.sort(key=key)
+        logger.info(f"排序超出内存预算，外部归并 {len(runs) + 1} 段，共 {sum(map(len, runs)) + len(chunk)} 行")
+        return heapq.merge(*runs, chunk, key=key)
@@ -2,7 +2,10 @@ from typing import Dict, List, Any, Optional
 import sqlparse
 from sqlparse.sql import Where, Comparison, Identifier, Token, Parenthesis
 from sqlparse.tokens import Keyword, DML
+from app.core.exceptions import SQLParseError
 from app.core.logger import logger
+from app.services.plan_cache import plan_cache, normalize_sql
+from app.services.sql_template import extract_literals, is_bindable, bind_parameters
 from app.models.sql_models import (
     TableInfo,
     SelectField,
@@ -11,36 +14,104 @@ from app.models.sql_models import (
     SQLParseResult
 )
 
+# 支持的JOIN关键字（空白已规范化）及对应的JOIN类型
+_JOIN_KEYWORDS = {
+    'JOIN': 'INNER',
+    'INNER JOIN': 'INNER',
+    'LEFT JOIN': 'LEFT',
+    'LEFT OUTER JOIN': 'LEFT',
+    'RIGHT JOIN': 'RIGHT',
+    'RIGHT OUTER JOIN': 'RIGHT'
+}
+
+class _ParseFailure:
+    """解析失败的SQL在文本缓存中的记录"""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
 class SQLParser:
     def parse_sql(self, sql: str) -> Dict[str, Any]:
-        """解析SQL语句，支持多表关联查询"""
+        """
+        解析SQL语句
+        仅字面量不同的SQL共享同一解析模板，命中时只需绑定新的字面量并重新展开IN条件
+        """
+        normalized_sql = normalize_sql(sql)
+        shape, params = extract_literals(normalized_sql)
+
+        # 每次解析只计一次缓存查找：可绑定的SQL按模板计，其余按文本缓存计
+        template_key = f"shape:{shape}"
+        template = plan_cache.peek(template_key)
+        if template:
+            plan_cache.record(hit=True)
+            logger.debug(f"命中SQL解析模板: {shape}")
+            return self._build_result(bind_parameters(template, params))
+
+        if template is None:
+            try:
+                parse_result = self._parse_structure(shape)
+            except Exception as e:
+                # 模板解析失败时按原SQL解析，只报告原SQL的错误
+                logger.debug(f"SQL模板解析失败，按原SQL解析: {str(e)}")
+                parse_result = None
+            bindable = parse_result is not None and is_bindable(parse_result, len(params))
+            plan_cache.set(template_key, parse_result if bindable else False)
+            if bindable:
+                plan_cache.record(hit=False)
+                return self._build_result(bind_parameters(parse_result, params))
+
+        # 无法参数化的SQL按文本缓存，解析失败也缓存，再次解析时直接抛出同样的异常
+        text_key = f"sql:{normalized_sql}"
+        cached = plan_cache.get(text_key)
+        if isinstance(cached, _ParseFailure):
+            logger.debug(f"命中SQL解析缓存(解析失败): {normalized_sql}")
+            raise cached.error
+        if cached is not None:
+            logger.debug(f"命中SQL解析缓存: {normalized_sql}")
+            return cached
+
+        try:
+            parse_result = self._parse_structure(sql)
+        except Exception as e:
+            logger.error(f"SQL解析失败: {str(e)}", exc_info=True)
+            plan_cache.set(text_key, _ParseFailure(e))
+            raise
+        result = self._build_result(parse_result)
+        plan_cache.set(text_key, result)
+        return result
+
+    def _parse_structure(self, sql: str) -> SQLParseResult:
+        """解析SQL语句结构，支持多表关联查询"""
+        logger.debug(f"开始解析SQL: {sql}")
+        
+        # 格式化SQL
+        formatted_sql = sqlparse.format(sql, strip_comments=True).strip()
+        parsed = sqlparse.parse(formatted_sql)[0]
+        
+        # 解析表和别名
+        tables = self._parse_tables_and_joins(parsed)
+        
+        # 解析SELECT字段
+        fields = self._parse_select_fields(parsed)
+        
+        # 解析WHERE条件
+        conditions = self._parse_where_conditions(parsed)
+        
+        # 解析JOIN条件
+        joins = self._parse_join_conditions(parsed)
+        logger.debug(f"JOIN条件: {joins}")
+
+        return SQLParseResult(
+            tables=tables,
+            fields=fields,
+            where_conditions=conditions,
+            join_conditions=joins
+        )
+
+    def _build_result(self, parse_result: SQLParseResult) -> Dict[str, Any]:
+        """根据解析结构组装各表的请求参数，IN条件展开为多个请求"""
         try:
-            logger.debug(f"开始解析SQL: {sql}")
-            
-            # 格式化SQL
-            formatted_sql = sqlparse.format(sql, strip_comments=True).strip()
-            parsed = sqlparse.parse(formatted_sql)[0]
-            
-            # 解析表和别名
-            tables = self._parse_tables_and_joins(parsed)
-            
-            # 解析SELECT字段
-            fields = self._parse_select_fields(parsed)
-            
-            # 解析WHERE条件
-            conditions = self._parse_where_conditions(parsed)
-            
-            # 解析JOIN条件
-            joins = self._parse_join_conditions(parsed)
-            logger.debug(f"JOIN条件: {joins}")
-
-            parse_result = SQLParseResult(
-                tables=tables,
-                fields=fields,
-                where_conditions=conditions,
-                join_conditions=joins
-            )
-            
             # 组装结果
             tables_result = []
             for table_info in parse_result.tables:
@@ -100,15 +171,15 @@ class SQLParser:
             # 返回完整结果
             result = {
                 'tables': tables_result,
-                'where_conditions': conditions,
-                'join_conditions': joins
+                'where_conditions': parse_result.where_conditions,
+                'join_conditions': parse_result.join_conditions
             }
             
             logger.debug(f"SQL解析结果: {result}")
             return result
             
         except Exception as e:
-            logger.error(f"SQL解析失败: {str(e)}", exc_info=True)
+            logger.error(f"SQL解析结果组装失败: {str(e)}", exc_info=True)
             raise
 
     def _parse_tables_and_joins(self, parsed) -> List[TableInfo]:
@@ -286,7 +357,8 @@ class SQLParser:
         """解析WHERE token中的条件"""
         conditions = []
         
-        for item in where_token.tokens:
+        previous_index = 0
+        for index, item in enumerate(where_token.tokens):
             logger.debug(f"WHERE条件: {item}")
             if item.is_whitespace:
                 continue
@@ -295,10 +367,11 @@ class SQLParser:
                 if condition:
                     conditions.append(condition)
             elif item.ttype is Keyword and 'IN' in item.value.upper():
-                # 处理IN条件
-                condition = self._parse_comparison_IN(where_token.tokens)
+                # 处理IN条件，从IN前的字段开始解析
+                condition = self._parse_comparison_IN(where_token.tokens[previous_index:])
                 if condition:
                     conditions.append(condition)
+            previous_index = index
         
         return conditions
 
@@ -391,14 +464,13 @@ class SQLParser:
             # 扩展操作符支持
             if token.value.upper() == 'LIKE':
                 operator = 'LIKE'
-            elif token.value in ['=', '>', '<', '>=', '<=', '!=', '<>']:
-                operator = '='
+            elif token.value in ['=', '>', '<', '>=', '<=', '!=']:
+                operator = token.value
+            elif token.value == '<>':
+                operator = '!='
                 
         if left and operator and right:
-            # 处理 LIKE 条件的值，去掉 % 号
-            if operator == 'LIKE':
-                right = right.replace('%', '')
-            
+            # LIKE 条件的值保留通配符，由 LikePattern 编译后匹配
             if "." in left:
                 left_table = left.split('.')
                 return WhereCondition(
@@ -416,7 +488,7 @@ class SQLParser:
                 )
         return None
     
-    def _parse_comparison_on(self, comparison, sequence: int) -> Optional[JoinCondition]:
+    def _parse_comparison_on(self, comparison, sequence: int, join_type: str = 'INNER') -> Optional[JoinCondition]:
         """解析比较表达式"""
         left = None
         operator = None
@@ -447,7 +519,8 @@ class SQLParser:
                 leftColumn=left_table[1],
                 rightTable=right_table[0],
                 rightColumn=right_table[1],
-                sequence=sequence  # 使用传入的序号
+                sequence=sequence,  # 使用传入的序号
+                joinType=join_type
             )
         return None
 
@@ -457,6 +530,7 @@ class SQLParser:
         join_seen = False
         on_seen = False
         sequence = 0  # JOIN序号计数器
+        join_type = 'INNER'
         
         for token in parsed.tokens:
             if token.is_whitespace:
@@ -464,22 +538,39 @@ class SQLParser:
                 
             if 'JOIN' in str(token).upper():
                 join_seen = True
+                on_seen = False
                 sequence += 1  # 每遇到一个JOIN就增加序号
+                join_type = self._get_join_type(token.value)
                 continue
                 
-            if join_seen and 'ON' in str(token).upper():
+            if join_seen and not on_seen and 'ON' in str(token).upper():
                 on_seen = True
                 continue
                 
             if on_seen and isinstance(token, Comparison):
-                condition = self._parse_comparison_on(token, sequence)  # 传递序号
+                condition = self._parse_comparison_on(token, sequence, join_type)  # 传递序号
                 if condition:
                     conditions.append(condition)
+                continue
+
+            # ON a = b AND c = d 组成多列连接键
+            if on_seen and token.ttype is Keyword and token.value.upper() == 'AND':
+                continue
+
+            if on_seen:
                 on_seen = False
                 join_seen = False
                 
         return conditions
 
+    def _get_join_type(self, join_keyword: str) -> str:
+        """从JOIN关键字获取JOIN类型，FULL、CROSS、NATURAL等不支持的JOIN直接报错，不按INNER JOIN处理"""
+        keyword = ' '.join(join_keyword.upper().split())
+        join_type = _JOIN_KEYWORDS.get(keyword)
+        if join_type is None:
+            raise SQLParseError(f"不支持的JOIN类型: {keyword}")
+        return join_type
+
     def _parse_order_by_conditions(self, parsed) -> List[WhereCondition]:
         """解析ORDER BY条件"""
         order_conditions = []
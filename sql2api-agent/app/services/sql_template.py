@@ -0,0 +1,96 @@
+from typing import Any, List, Tuple, Union
+import re
+from app.models.sql_models import SQLParseResult
+
+_LITERAL = r"'(?:[^'\\]|\\.|'')*'|(?<![\w.])\d+(?:\.\d+)?(?![\w.])"
+
+# 按顺序匹配：LIMIT/OFFSET 数值保留在模板中；IN列表整体作为一个参数；字符串和数值字面量各为一个参数
+_TEMPLATE_PATTERN = re.compile(
+    r"(?P<keep>\b(?:LIMIT|OFFSET)\s+\d+(?:\s*,\s*\d+)?|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)"
+    rf"|(?P<in>\bIN\s*\(\s*(?:{_LITERAL})(?:\s*,\s*(?:{_LITERAL}))*\s*\))"
+    rf"|(?P<literal>{_LITERAL})",
+    re.IGNORECASE
+)
+_IN_ITEM_PATTERN = re.compile(_LITERAL)
+_PLACEHOLDER_PATTERN = re.compile(r"__p(\d+)__")
+
+Parameter = Union[str, List[str]]
+
+
+def placeholder(index: int) -> str:
+    return f"__p{index}__"
+
+
+def extract_literals(sql: str) -> Tuple[str, List[Parameter]]:
+    """
+    提取SQL中的字面量，返回 (SQL模板, 参数列表)
+    字面量替换为 '__pN__'，IN列表替换为 IN ('__pN__')，对应参数为原始字面量列表
+    """
+    params: List[Parameter] = []
+
+    def replace(match):
+        if match.group('keep'):
+            return match.group(0)
+        index = len(params)
+        if match.group('in'):
+            params.append(_IN_ITEM_PATTERN.findall(match.group('in')[2:]))
+            return f"IN ('{placeholder(index)}')"
+        params.append(match.group('literal'))
+        return f"'{placeholder(index)}'"
+
+    return _TEMPLATE_PATTERN.sub(replace, sql), params
+
+
+def _literal_value(raw: str) -> str:
+    """与SQLParser一致：去掉引号"""
+    return raw.strip().strip("'").strip('"')
+
+
+def _contains_placeholder(value: Any) -> bool:
+    if isinstance(value, str):
+        return '__p' in value
+    if isinstance(value, list):
+        return any(_contains_placeholder(item) for item in value)
+    return False
+
+
+def is_bindable(parse_result: SQLParseResult, param_count: int) -> bool:
+    """模板中每个参数恰好作为一个WHERE条件的完整值出现一次，且不出现在其他位置时才可绑定"""
+    for item in parse_result.tables + parse_result.fields + parse_result.join_conditions:
+        if any(_contains_placeholder(value) for value in vars(item).values()):
+            return False
+
+    seen = set()
+    for condition in parse_result.where_conditions:
+        if _contains_placeholder(condition.table) or _contains_placeholder(condition.column):
+            return False
+        if not _contains_placeholder(condition.value):
+            continue
+        value = condition.value
+        if condition.operator == 'IN':
+            if not (isinstance(value, list) and len(value) == 1):
+                return False
+            value = value[0]
+        match = _PLACEHOLDER_PATTERN.fullmatch(value) if isinstance(value, str) else None
+        if match is None or int(match.group(1)) in seen:
+            return False
+        seen.add(int(match.group(1)))
+
+    return seen == set(range(param_count))
+
+
+def bind_parameters(template: SQLParseResult, params: List[Parameter]) -> SQLParseResult:
+    """将参数绑定到解析模板（就地修改，调用方需传入模板的副本）"""
+    for condition in template.where_conditions:
+        if condition.operator == 'IN':
+            if isinstance(condition.value, list) and len(condition.value) == 1:
+                match = _PLACEHOLDER_PATTERN.fullmatch(condition.value[0])
+                if match:
+                    raw_values = params[int(match.group(1))]
+                    condition.value = [_literal_value(raw) for raw in raw_values]
+            continue
+
+        match = _PLACEHOLDER_PATTERN.fullmatch(condition.value) if isinstance(condition.value, str) else None
+        if match:
+            condition.value = _literal_value(params[int(match.group(1))])
+    return template
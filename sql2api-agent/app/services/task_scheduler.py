@@ -0,0 +1,45 @@
+from typing import Any, Awaitable, Callable, List, Optional
+import asyncio
+from app.core.config import settings
+
+
+class TaskScheduler:
+    """有界并发调度器：单次查询并发上限 + 进程级全局并发上限"""
+
+    def __init__(self, global_limit: int):
+        self.global_limit = global_limit
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_global_semaphore(self) -> asyncio.Semaphore:
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.global_limit)
+        return self._global_semaphore
+
+    async def run_all(
+        self,
+        factories: List[Callable[[], Awaitable[Any]]],
+        limit: int
+    ) -> List[Any]:
+        """
+        并发执行所有任务，结果顺序与factories一致
+        任一任务失败时取消其余未完成的任务并抛出该异常
+        """
+        query_semaphore = asyncio.Semaphore(max(1, limit))
+        global_semaphore = self._get_global_semaphore()
+
+        async def run(factory):
+            async with query_semaphore:
+                async with global_semaphore:
+                    return await factory()
+
+        tasks = [asyncio.ensure_future(run(factory)) for factory in factories]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+
+task_scheduler = TaskScheduler(settings.API_GLOBAL_CONCURRENCY)
@@ -0,0 +1,85 @@
+"""
+并发元数据访问时的事件循环延迟：同步数据库调用直接在 async 处理函数中执行（原实现）
+与交给数据库线程池（run_in_db_executor）对比
+
+数据库往返用阻塞的 time.sleep 模拟（DB_ROUND_TRIP 秒），不需要MySQL；
+事件循环延迟：每隔 INTERVAL 秒 sleep 一次，实际唤醒时间比预期晚的部分；
+两种方式的查询结果须一致
+
+用法（在 sql2api-agent 目录下）:
+    python -m benchmarks.db_executor_benchmark [并发请求数 ...]
+"""
+import asyncio
+import sys
+import time
+
+from app.core.config import settings
+from app.db.database import db_executor, run_in_db_executor
+from benchmarks.loop_lag_benchmark import percentile
+
+INTERVAL = 0.005
+DB_ROUND_TRIP = 0.02
+
+
+def mapping_row(table_name: str):
+    return {'table_name': table_name, 'api_url': f"http://upstream/{table_name}", 'method': 'POST'}
+
+
+def load_mapping(table_name: str):
+    """模拟一次同步的映射查询：阻塞当前线程一个数据库往返"""
+    time.sleep(DB_ROUND_TRIP)
+    return mapping_row(table_name)
+
+
+async def inline_handler(table_name: str):
+    return load_mapping(table_name)
+
+
+async def executor_handler(table_name: str):
+    return await run_in_db_executor(load_mapping, table_name)
+
+
+async def monitor(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + INTERVAL
+        await asyncio.sleep(INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run(handler, count):
+    """count 个请求同时到达，返回 (结果, 总耗时秒, 循环延迟列表)"""
+    lags, stop = [], asyncio.Event()
+    ticker = asyncio.ensure_future(monitor(lags, stop))
+    # 先让监测协程开始计时
+    await asyncio.sleep(INTERVAL)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(handler(f"table{i}") for i in range(count)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return results, elapsed, lags
+
+
+def main(counts):
+    failures = 0
+    for count in counts:
+        print(
+            f"{count} 个并发的映射查询，数据库往返 {DB_ROUND_TRIP * 1000:.0f}ms，"
+            f"线程池 {settings.DB_EXECUTOR_WORKERS} 个线程:"
+        )
+        expected = [mapping_row(f"table{i}") for i in range(count)]
+        for label, handler in (("事件循环内同步调用", inline_handler), ("数据库线程池", executor_handler)):
+            results, elapsed, lags = asyncio.run(run(handler, count))
+            same = results == expected
+            failures += not same
+            print(
+                f"  {label:<10} 共 {elapsed * 1000:7.1f}ms  循环延迟 p50 {percentile(lags, 0.5) * 1000:6.1f}ms  "
+                f"最大 {max(lags) * 1000:7.1f}ms  结果{'一致' if same else '不一致'}"
+            )
+    db_executor.shutdown()
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main([int(arg) for arg in sys.argv[1:]] or [40, 200]) else 0)
@@ -0,0 +1,109 @@
+"""
+等值连接的正确性校验与耗时对比：JoinService.hash_join 与原实现（逐对比较的嵌套循环）
+
+正确性：随机生成含NULL键、重复键的两侧数据（两侧大小不同，分别覆盖在左侧、右侧建表），
+INNER/LEFT/RIGHT 的输出须与嵌套循环完全一致（包括顺序）；
+耗时：两侧各N行、两列连接键；嵌套循环超过 NESTED_MAX_ROWS 行时只对左侧前 NESTED_MAX_ROWS 行运行，
+按比例估算全量耗时，并与哈希连接在同样输入上的结果对比
+
+用法（在 sql2api-agent 目录下）:
+    python -m benchmarks.hash_join_benchmark [每侧行数 ...]
+"""
+import random
+import sys
+import time
+from operator import itemgetter
+
+from app.services.join_service import JOIN_TYPES, JoinService
+
+NESTED_MAX_ROWS = 2000
+
+left_key = itemgetter('a', 'b')
+right_key = itemgetter('a', 'b')
+
+
+def key_or_none(key_func):
+    """连接键含NULL时返回None，与 join_tables 中的键函数一致"""
+    def key(row):
+        value = key_func(row)
+        return None if None in value else value
+    return key
+
+
+def nested_loop(left, right, join_type):
+    """原实现：左侧每行与右侧每行逐一比较，NULL键不匹配"""
+    pairs = []
+    right_matched = [False] * len(right)
+    for left_row in left:
+        matched = False
+        for index, right_row in enumerate(right):
+            if left_row['a'] is not None and left_row['b'] is not None \
+                    and left_row['a'] == right_row['a'] and left_row['b'] == right_row['b']:
+                pairs.append((left_row, right_row))
+                right_matched[index] = True
+                matched = True
+        if not matched and join_type == 'LEFT':
+            pairs.append((left_row, None))
+    if join_type == 'RIGHT':
+        pairs.extend((None, row) for index, row in enumerate(right) if not right_matched[index])
+    return pairs
+
+
+def make_rows(count: int, keys: int, rng: random.Random, side: str):
+    rows = []
+    for i in range(count):
+        a = rng.randrange(keys) if rng.random() > 0.02 else None
+        rows.append({'id': f"{side}{i}", 'a': a, 'b': rng.randrange(2)})
+    return rows
+
+
+def hash_join(left, right, join_type):
+    return JoinService.hash_join(left, right, key_or_none(left_key), key_or_none(right_key), join_type)
+
+
+def check_correctness(rounds: int = 300) -> int:
+    failures = 0
+    rng = random.Random(0)
+    for _ in range(rounds):
+        keys = rng.randrange(1, 20)
+        left = make_rows(rng.randrange(30), keys, rng, 'l')
+        right = make_rows(rng.randrange(30), keys, rng, 'r')
+        for join_type in JOIN_TYPES:
+            if hash_join(left, right, join_type) != nested_loop(left, right, join_type):
+                failures += 1
+                print(f"  随机用例失败: {join_type} 左 {len(left)} 行 右 {len(right)} 行")
+    print(f"正确性: {rounds} 组随机数据 x {len(JOIN_TYPES)} 种连接，失败 {failures} 个")
+    return failures
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    failures = check_correctness()
+    for size in sizes:
+        rng = random.Random(size)
+        left = make_rows(size, size, rng, 'l')
+        right = make_rows(size, size, rng, 'r')
+        sample = left[:NESTED_MAX_ROWS]
+        estimated = len(sample) < len(left)
+        print(f"每侧 {size} 行，两列连接键{f'（嵌套循环按左侧前 {len(sample)} 行估算）' if estimated else ''}:")
+        for join_type in JOIN_TYPES:
+            pairs, hash_seconds = timed(lambda: hash_join(left, right, join_type))
+            expected, nested_seconds = timed(lambda: nested_loop(sample, right, join_type))
+            nested_seconds *= len(left) / len(sample)
+            same = (hash_join(sample, right, join_type) if estimated else pairs) == expected
+            failures += not same
+            print(
+                f"  {join_type:<5} 哈希连接 {hash_seconds * 1000:8.1f}ms ({len(pairs)} 行)  "
+                f"嵌套循环 {nested_seconds * 1000:10.1f}ms{'(估算)' if estimated else ''}  "
+                f"x{nested_seconds / hash_seconds:6.0f}  结果{'一致' if same else '不一致'}"
+            )
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]) else 0)
@@ -0,0 +1,107 @@
+"""
+上游调用吞吐量：进程级共享连接池（http_client_manager）与原实现（每次调用新建 httpx.AsyncClient）对比
+
+上游为本机 uvicorn 启动的桩服务（独立线程、独立事件循环），按请求参数返回固定的行；
+两种方式逐个请求校验返回结果一致
+
+用法（在 sql2api-agent 目录下）:
+    python -m benchmarks.http_client_benchmark [请求数 ...]
+"""
+import asyncio
+import json
+import logging
+import socket
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.api_caller import APICaller
+from app.services.http_client import http_client_manager
+
+CONCURRENCY = 20
+ROWS_PER_CALL = 20
+
+stub = FastAPI()
+
+
+@stub.post("/rows")
+async def rows(body: dict):
+    """按 id 返回固定的行，便于校验两种方式结果一致"""
+    key = body['params']['id']
+    return [{'id': key, 'line': i, 'name': f"item{key}-{i}"} for i in range(ROWS_PER_CALL)]
+
+
+def start_stub():
+    """在后台线程启动桩服务，返回 (服务, 地址)"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(stub, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}/rows"
+
+
+async def legacy_call(api_config, params):
+    """原实现：每次调用新建客户端，连接用完即关闭"""
+    async with httpx.AsyncClient(timeout=settings.API_TIMEOUT) as client:
+        template = dict(api_config['template'])
+        template['params'] = dict(template['params'], **params)
+        response = await client.post(api_config['url'], json=template)
+        response.raise_for_status()
+        return json.loads(response.content.decode('utf-8'))
+
+
+async def run(call, url, count):
+    """CONCURRENCY 个并发调用方依次发出共 count 个请求，返回 (按 id 排列的结果, 耗时秒)"""
+    api_config = {'url': url, 'method': 'POST', 'template': {'params': {}}}
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(key):
+        async with semaphore:
+            return await call(api_config, {'id': key})
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(key) for key in range(count)))
+    return results, time.perf_counter() - start
+
+
+async def compare(url, count):
+    legacy, legacy_seconds = await run(legacy_call, url, count)
+    # 每轮新建共享客户端，避免上一轮的连接影响结果
+    await http_client_manager.startup()
+    pooled, pooled_seconds = await run(APICaller().call_api_async, url, count)
+    metrics = http_client_manager.get_metrics()
+    await http_client_manager.shutdown()
+    same = pooled == legacy
+    print(
+        f"  每次新建客户端 {legacy_seconds * 1000:8.1f}ms {count / legacy_seconds:7.0f} 请求/秒  "
+        f"共享连接池 {pooled_seconds * 1000:8.1f}ms {count / pooled_seconds:7.0f} 请求/秒 "
+        f"(x{legacy_seconds / pooled_seconds:4.1f}，{metrics['connections']} 个连接)  结果{'一致' if same else '不一致'}"
+    )
+    return same
+
+
+def main(counts):
+    # 共享连接池路径（APICaller）逐个响应输出DEBUG日志，不计入对比
+    logger.setLevel(logging.WARNING)
+    server, url = start_stub()
+    failures = 0
+    try:
+        for count in counts:
+            print(f"{count} 个POST请求，并发 {CONCURRENCY}，每个返回 {ROWS_PER_CALL} 行:")
+            failures += not asyncio.run(compare(url, count))
+    finally:
+        server.should_exit = True
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main([int(arg) for arg in sys.argv[1:]] or [200, 1000]) else 0)
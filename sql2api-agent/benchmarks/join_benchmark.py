@@ -0,0 +1,94 @@
+"""
+连接结果的内存与分配对比：紧凑行集合（列名一份 + 值元组）与每行一个字典
+
+用法（在 sql2api-agent 目录下）:
+    python -m benchmarks.join_benchmark [订单行数 ...]
+"""
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from app.models.sql_models import JoinCondition
+from app.services.join_service import JoinService
+from app.services.merge_service import MergeService
+from app.services.sql_parser import SQLParser
+
+QUERIES = [
+    "SELECT o.id, o.amount, c.name FROM orders o JOIN customers c ON o.customer_id = c.id "
+    "WHERE o.amount > 100 ORDER BY amount DESC",
+    "SELECT * FROM orders o JOIN customers c ON o.customer_id = c.id WHERE o.status != 'open'",
+]
+JOINS = [JoinCondition(leftTable='o', leftColumn='customer_id', rightTable='c', rightColumn='id', sequence=1, joinType='INNER')]
+
+
+def make_tables(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    customers = count // 10 + 1
+    orders = [
+        {
+            'id': i,
+            'customer_id': rng.randrange(customers),
+            'amount': rng.randrange(1000),
+            'status': rng.choice(['open', 'closed']),
+            'created': f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            'note': f"n{i}",
+        }
+        for i in range(count)
+    ]
+    customer_rows = [
+        {'id': i, 'name': f"c{i}", 'city': rng.choice(['a', 'b', 'c']), 'level': i % 5}
+        for i in range(customers)
+    ]
+    return {'o': orders, 'c': customer_rows}
+
+
+def measure(func):
+    """返回 (结果, 耗时秒, 结果占用字节, 峰值字节, 结果占用的内存块数)"""
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = func()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    return result, seconds, held, peak, sys.getallocatedblocks() - blocks
+
+
+def main(sizes):
+    for size in sizes:
+        tables = make_tables(size)
+        print(f"{size} 行订单 JOIN {len(tables['c'])} 行客户:")
+
+        merged, seconds, held, peak, blocks = measure(lambda: JoinService.join_tables(tables, 'o', JOINS))
+        print(
+            f"  连接(值元组)   {seconds * 1000:7.1f}ms  结果 {held / 2 ** 20:6.1f}MB  峰值 {peak / 2 ** 20:6.1f}MB  "
+            f"内存块 {blocks:>9}  {len(merged)} 行"
+        )
+        _, seconds, held, peak, blocks = measure(merged.to_dicts)
+        print(
+            f"  转换为字典     {seconds * 1000:7.1f}ms  结果 {held / 2 ** 20:6.1f}MB  峰值 {peak / 2 ** 20:6.1f}MB  "
+            f"内存块 {blocks:>9}"
+        )
+
+        for sql in QUERIES:
+            parsed = SQLParser().parse_sql(sql)
+
+            def run():
+                data = JoinService.join_tables(tables, 'o', JOINS)
+                return list(MergeService.iter_results([{'table': 'merged_results', 'data': data}], parsed))
+
+            result, seconds, held, peak, _ = measure(run)
+            print(
+                f"  连接+合并 {seconds * 1000:7.1f}ms  输出 {held / 2 ** 20:6.1f}MB  峰值 {peak / 2 ** 20:6.1f}MB  "
+                f"{len(result)} 行  {sql[:40]}..."
+            )
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100000])
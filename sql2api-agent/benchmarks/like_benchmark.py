@@ -0,0 +1,100 @@
+"""
+LIKE条件的过滤吞吐量：与原实现（去掉 % 后逐行转小写做包含匹配）对比多个LIKE条件的过滤耗时，
+过滤结果与按定义逐字符匹配的参考实现对比；LIKE语义的正确性见 tests/test_like_matcher.py
+
+用法（在 sql2api-agent 目录下）:
+    python -m benchmarks.like_benchmark [行数 ...]
+"""
+import random
+import sys
+import time
+from functools import lru_cache
+
+from app.services.like_matcher import LikePattern
+from app.services.merge_service import MergeService
+from app.services.sql_parser import SQLParser
+
+QUERIES = [
+    "SELECT id, name FROM users WHERE name LIKE '%7%'",
+    "SELECT id, name FROM users WHERE name LIKE 'user1%' AND email LIKE '%@example.com'",
+    "SELECT id, name FROM users WHERE name LIKE 'user_2%' AND email LIKE '%mail%'",
+]
+
+
+def reference_like(pattern: str, value) -> bool:
+    """按定义逐字符匹配的参考实现"""
+    if value is None:
+        return False
+    tokens = []
+    chars = iter(pattern)
+    for char in chars:
+        if char == '\\':
+            tokens.append(('lit', next(chars, '\\').lower()))
+        elif char in ('%', '_'):
+            tokens.append((char, None))
+        else:
+            tokens.append(('lit', char.lower()))
+    text = str(value).lower()
+
+    @lru_cache(maxsize=None)
+    def match(i: int, j: int) -> bool:
+        if i == len(tokens):
+            return j == len(text)
+        kind, char = tokens[i]
+        if kind == '%':
+            return any(match(i + 1, k) for k in range(j, len(text) + 1))
+        if j == len(text):
+            return False
+        return (kind == '_' or text[j] == char) and match(i + 1, j + 1)
+
+    return match(0, 0)
+
+
+def legacy_filter(data, patterns):
+    """原实现：模式去掉 % 后逐行逐条件转小写做包含匹配"""
+    conditions = [(column, pattern.replace('%', '')) for column, pattern in patterns]
+    result = []
+    for item in data:
+        if all(str(value).lower() in str(item[column]).lower() for column, value in conditions if column in item):
+            result.append(item)
+    return result
+
+
+def make_rows(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    domains = ['example.com', 'mail.com', 'corp.example.com']
+    return [
+        {'id': i, 'name': f"User{rng.randrange(count)}", 'email': f"u{i}@{rng.choice(domains)}"}
+        for i in range(count)
+    ]
+
+
+def main(sizes):
+    failures = 0
+    for size in sizes:
+        rows = make_rows(size)
+        print(f"{size} 行:")
+        for sql in QUERIES:
+            conditions = [
+                condition for condition in SQLParser().parse_sql(sql)['where_conditions']
+                if condition.operator == 'LIKE'
+            ]
+            start = time.perf_counter()
+            legacy = legacy_filter(rows, [(c.column, c.value) for c in conditions])
+            legacy_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            compiled = MergeService.filter_by_conditions(rows, conditions)
+            compiled_seconds = time.perf_counter() - start
+            expected = [row for row in rows if all(reference_like(c.value, row[c.column]) for c in conditions)]
+            failures += compiled != expected
+            kinds = ','.join(LikePattern(c.value).kind for c in conditions)
+            print(
+                f"  [{kinds}] 原实现 {legacy_seconds * 1000:7.1f}ms ({len(legacy)} 行)  "
+                f"编译后 {compiled_seconds * 1000:7.1f}ms ({len(compiled)} 行)  "
+                f"{size / compiled_seconds / 1e6:5.2f}M行/秒  结果{'正确' if compiled == expected else '错误'}"
+            )
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main([int(arg) for arg in sys.argv[1:]] or [100000, 1000000]) else 0)
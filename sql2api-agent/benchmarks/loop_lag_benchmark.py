@@ -0,0 +1,131 @@
+"""
+混合负载下的事件循环延迟：持续执行小查询的同时穿插大结果集的连接+排序，
+对比合并计算全部在事件循环中执行与大查询交给进程池执行时的事件循环延迟、小查询耗时
+
+事件循环延迟：每隔 INTERVAL 秒 sleep 一次，实际唤醒时间比预期晚的部分
+
+用法（在 sql2api-agent 目录下）:
+    python -m benchmarks.loop_lag_benchmark [大查询订单行数 ...]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from app.services.join_service import JoinService
+from app.services.merge_pool import merge_pool
+from app.services.merge_service import MergeService
+from app.services.spill import MemoryBudget
+from app.services.sql_parser import SQLParser
+from benchmarks.join_benchmark import JOINS, make_tables
+
+INTERVAL = 0.005
+# 小查询：单表数百行的过滤+排序，每隔 SMALL_EVERY 秒发起一个
+SMALL_ROWS = 300
+SMALL_EVERY = 0.01
+SMALL_SQL = "SELECT id, amount, status FROM orders WHERE amount > 100 ORDER BY amount DESC, id"
+# 大查询：订单 JOIN 客户后排序，依次发起 LARGE_QUERIES 个，每次最多 LARGE_CONCURRENCY 个同时执行
+LARGE_QUERIES = 6
+LARGE_CONCURRENCY = 2
+# 大查询合并前等待上游返回的时间
+UPSTREAM_WAIT = 0.2
+LARGE_SQL = (
+    "SELECT o.id, o.amount, c.name FROM orders o JOIN customers c ON o.customer_id = c.id "
+    "WHERE o.amount > 100 ORDER BY amount DESC, id"
+)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def monitor(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + INTERVAL
+        await asyncio.sleep(INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def large_query(tables, parsed):
+    """与 APIService 的多表查询一致：各表合计行数超过阈值时推迟连接，与合并一起交给进程池"""
+    join = {'table_results': tables, 'base_alias': 'o', 'join_conditions': JOINS}
+    if merge_pool.should_offload(sum(len(rows) for rows in tables.values())):
+        result = {'table': 'merged_results', 'join': join}
+    else:
+        result = {
+            'table': 'merged_results',
+            'data': JoinService.join_tables(**join, budget=MemoryBudget.from_settings())
+        }
+    return await MergeService.merge_results([result], parsed)
+
+
+async def small_queries(rows, parsed, latencies, stop):
+    async def one(issued):
+        await MergeService.merge_results([{'table': 'orders', 'data': rows}], parsed)
+        latencies.append(time.perf_counter() - issued)
+
+    # 按固定间隔到达：事件循环被占用期间到达的查询在恢复后一起发起，按到达时间计时
+    tasks = []
+    start = time.perf_counter()
+    issued = 0
+    while not stop.is_set():
+        arrived = int((time.perf_counter() - start) / SMALL_EVERY) + 1
+        tasks.extend(asyncio.ensure_future(one(start + i * SMALL_EVERY)) for i in range(issued, arrived))
+        issued = arrived
+        await asyncio.sleep(SMALL_EVERY)
+    await asyncio.gather(*tasks)
+
+
+async def run(size, workers):
+    merge_pool.workers = workers
+    await merge_pool.startup()
+    tables = make_tables(size)
+    small_rows = make_tables(SMALL_ROWS, seed=1)['o']
+    large_parsed = SQLParser().parse_sql(LARGE_SQL)
+    small_parsed = SQLParser().parse_sql(SMALL_SQL)
+
+    lags, latencies, stop = [], [], asyncio.Event()
+    background = [
+        asyncio.ensure_future(monitor(lags, stop)),
+        asyncio.ensure_future(small_queries(small_rows, small_parsed, latencies, stop)),
+    ]
+    semaphore = asyncio.Semaphore(LARGE_CONCURRENCY)
+    large_seconds = []
+
+    async def large():
+        async with semaphore:
+            start = time.perf_counter()
+            await asyncio.sleep(UPSTREAM_WAIT)
+            await large_query(tables, large_parsed)
+            large_seconds.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(large() for _ in range(LARGE_QUERIES)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*background)
+    merge_pool.shutdown()
+
+    mode = f"进程池({workers})" if workers else "事件循环内"
+    print(
+        f"  {mode:<8} 循环延迟 p50 {percentile(lags, 0.5) * 1000:6.1f}ms  p99 {percentile(lags, 0.99) * 1000:7.1f}ms  "
+        f"最大 {max(lags) * 1000:7.1f}ms | 小查询 {len(latencies):>4} 个 p50 {percentile(latencies, 0.5) * 1000:6.1f}ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:7.1f}ms | 大查询 平均 {statistics.mean(large_seconds) * 1000:7.1f}ms  "
+        f"共 {elapsed:5.2f}s"
+    )
+
+
+def main(sizes):
+    for size in sizes:
+        print(
+            f"大查询 {size} 行订单 JOIN 客户 x{LARGE_QUERIES}（同时 {LARGE_CONCURRENCY} 个，上游耗时 {UPSTREAM_WAIT * 1000:.0f}ms），"
+            f"小查询 {SMALL_ROWS} 行每 {SMALL_EVERY * 1000:.0f}ms 一个:"
+        )
+        for workers in (0, LARGE_CONCURRENCY):
+            asyncio.run(run(size, workers))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [50000, 200000])
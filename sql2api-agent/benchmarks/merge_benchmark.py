@@ -0,0 +1,92 @@
+"""
+MergeService 逐行排序与列式排序的性能对比，以及字符串日期等列按值推断类型与声明列类型的对比，
+同时校验各条路径结果一致
+
+用法（在 sql2api-agent 目录下）:
+    python -m benchmarks.merge_benchmark [行数 ...]
+"""
+import asyncio
+import random
+import sys
+import time
+from unittest import mock
+
+from app.services.column_schema import ColumnSchema
+from app.services.merge_service import MergeService
+from app.services.sql_parser import SQLParser
+
+QUERIES = [
+    "SELECT id, created, amount FROM orders WHERE status != 'closed' ORDER BY created DESC, amount",
+    "SELECT id, name, amount FROM orders WHERE amount < 500 ORDER BY name, id DESC",
+    "SELECT id, name, created FROM orders WHERE name LIKE '%7%' ORDER BY name DESC, created",
+]
+
+
+# 字符串日期、字符串数值列：未声明类型时每行排序、比较都要推断类型
+TYPED_QUERIES = [
+    "SELECT id, created FROM orders WHERE created >= '2024-03-01' ORDER BY created DESC, id",
+    "SELECT id, amount FROM orders WHERE amount > 100 ORDER BY amount DESC, created",
+]
+SCHEMA = {'id': 'int', 'amount': 'float', 'created': 'date', 'name': 'string', 'status': 'string'}
+
+
+def make_rows(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    statuses = ['open', 'closed', 'pending', None]
+    rows = []
+    for i in range(count):
+        rows.append({
+            'id': i,
+            'name': f"user{rng.randrange(count // 10 + 1)}",
+            'amount': rng.choice([rng.randrange(1000), str(rng.randrange(1000)), round(rng.random() * 1000, 2)]),
+            'created': f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            'status': rng.choice(statuses),
+        })
+    return rows
+
+
+def run(rows, parsed, min_rows: int, schema=None):
+    with mock.patch('app.services.columnar.settings.MERGE_COLUMNAR_MIN_ROWS', min_rows):
+        start = time.perf_counter()
+        if schema is not None:
+            # 与获取数据时一样先按列类型转换，计入耗时
+            rows = [dict(row) for row in rows]
+            schema.coerce_rows(rows)
+        result = {'table': 'orders', 'data': rows}
+        if schema is not None:
+            result['schema'] = schema
+        result = asyncio.run(MergeService.merge_results([result], parsed))
+        return result, time.perf_counter() - start
+
+
+def main(sizes):
+    for sql in QUERIES:
+        parsed = SQLParser().parse_sql(sql)
+        print(sql)
+        for size in sizes:
+            rows = make_rows(size)
+            row_result, row_seconds = run(rows, parsed, 0)
+            columnar_result, columnar_seconds = run(rows, parsed, 1)
+            same = row_result == columnar_result
+            print(
+                f"  {size:>8} 行: 逐行 {row_seconds * 1000:8.1f}ms  列式 {columnar_seconds * 1000:8.1f}ms  "
+                f"加速 {row_seconds / columnar_seconds:5.1f}x  结果{'一致' if same else '不一致'}"
+            )
+
+    schema = ColumnSchema(SCHEMA)
+    for sql in TYPED_QUERIES:
+        parsed = SQLParser().parse_sql(sql)
+        print(sql)
+        for size in sizes:
+            rows = make_rows(size)
+            untyped_result, untyped_seconds = run(rows, parsed, 0)
+            typed_result, typed_seconds = run(rows, parsed, 0, schema)
+            same = [row['id'] for row in untyped_result] == [row['id'] for row in typed_result]
+            print(
+                f"  {size:>8} 行: 推断类型 {untyped_seconds * 1000:8.1f}ms  声明类型(含转换) {typed_seconds * 1000:8.1f}ms  "
+                f"加速 {untyped_seconds / typed_seconds:5.1f}x  结果{'一致' if same else '不一致'}"
+            )
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 300000])
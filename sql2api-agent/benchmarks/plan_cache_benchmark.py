@@ -0,0 +1,86 @@
+"""
+SQL解析模板的正确性校验与耗时对比：命中解析模板（只绑定字面量）与冷解析（计划缓存关闭，每次完整解析）
+
+每类查询生成一批仅字面量不同的SQL（包括不同长度的IN列表），
+命中模板时的解析结果须与冷解析完全一致
+
+用法（在 sql2api-agent 目录下）:
+    python -m benchmarks.plan_cache_benchmark [每类SQL条数 ...]
+"""
+import logging
+import random
+import sys
+import time
+
+from app.core.logger import logger
+from app.services.plan_cache import plan_cache
+from app.services.sql_parser import SQLParser
+
+QUERIES = [
+    (
+        "JOIN + IN列表 + ORDER BY/LIMIT",
+        lambda rng: (
+            "SELECT o.id, o.amount, c.name FROM orders o JOIN customers c ON o.customer_id = c.id "
+            f"WHERE o.id IN ({', '.join(str(rng.randrange(10000)) for _ in range(rng.randrange(1, 20)))}) "
+            f"AND c.city = 'city{rng.randrange(50)}' ORDER BY o.amount DESC LIMIT 20"
+        )
+    ),
+    (
+        "单表 比较 + LIKE",
+        lambda rng: (
+            f"SELECT id, name, email FROM users WHERE age > {rng.randrange(18, 80)} "
+            f"AND name LIKE 'user{rng.randrange(100)}%' AND status = '{rng.choice(['active', 'locked'])}'"
+        )
+    ),
+    (
+        "单表 IN 字符串列表",
+        lambda rng: (
+            "SELECT id, amount FROM orders WHERE status IN "
+            f"({', '.join(repr(rng.choice(['open', 'closed', 'paid', 'refunded'])) for _ in range(rng.randrange(1, 4)))}) "
+            f"AND amount >= {rng.randrange(1000)}"
+        )
+    ),
+]
+
+
+def parse_all(sqls):
+    """返回 (解析结果列表, 平均每条耗时秒)"""
+    parser = SQLParser()
+    start = time.perf_counter()
+    results = [parser.parse_sql(sql) for sql in sqls]
+    return results, (time.perf_counter() - start) / len(sqls)
+
+
+def main(counts):
+    # 命中模板时逐条输出DEBUG日志，不计入对比
+    logger.setLevel(logging.WARNING)
+    max_size = plan_cache.max_size
+    failures = 0
+    for count in counts:
+        print(f"每类 {count} 条仅字面量不同的SQL:")
+        for label, make_sql in QUERIES:
+            rng = random.Random(count)
+            sqls = [make_sql(rng) for _ in range(count)]
+
+            plan_cache.clear()
+            plan_cache.max_size = 0
+            cold, cold_seconds = parse_all(sqls)
+
+            plan_cache.max_size = max_size
+            SQLParser().parse_sql(make_sql(rng))
+            hits = plan_cache.hits
+            bound, bound_seconds = parse_all(sqls)
+            template_hits = plan_cache.hits - hits
+
+            same = bound == cold
+            failures += not same
+            print(
+                f"  {label:<28} 冷解析 {cold_seconds * 1000:6.2f}ms/条  模板绑定 {bound_seconds * 1000:6.3f}ms/条 "
+                f"(x{cold_seconds / bound_seconds:4.0f}，命中 {template_hits}/{count})  结果{'一致' if same else '不一致'}"
+            )
+    plan_cache.clear()
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main([int(arg) for arg in sys.argv[1:]] or [200, 1000]) else 0)
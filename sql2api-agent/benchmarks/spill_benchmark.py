@@ -0,0 +1,102 @@
+"""
+超出内存预算时的分区连接与外部归并排序：校验结果与不限制内存时完全一致，并对比耗时和峰值内存
+
+用法（在 sql2api-agent 目录下）:
+    python -m benchmarks.spill_benchmark [订单行数 ...]
+"""
+import hashlib
+import pickle
+import sys
+
+from app.core.config import settings
+from app.models.sql_models import JoinCondition
+from app.services.join_service import JoinService
+from app.services.merge_service import MergeService
+from app.services.spill import MemoryBudget
+from app.services.sql_parser import SQLParser
+from benchmarks.join_benchmark import make_tables, measure
+
+# 预算远小于连接两侧的数据量
+BUDGET = 4 * 2 ** 20
+
+QUERIES = [
+    "SELECT o.id, o.amount, c.name FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY amount DESC, id",
+    "SELECT o.id, o.amount, c.city FROM orders o JOIN customers c ON o.customer_id = c.id "
+    "WHERE o.status != 'open' ORDER BY city, created DESC LIMIT 100 OFFSET 20",
+    "SELECT * FROM orders o JOIN customers c ON o.customer_id = c.id WHERE o.amount > 500",
+]
+
+
+def joins(join_type: str):
+    return [JoinCondition(
+        leftTable='o', leftColumn='customer_id', rightTable='c', rightColumn='id', sequence=1, joinType=join_type
+    )]
+
+
+def make_sparse_tables(count: int):
+    """部分订单没有对应客户、部分客户没有订单，且有NULL连接键，用于校验外连接"""
+    tables = make_tables(count)
+    tables['c'] = [row for row in tables['c'] if row['id'] % 7]
+    tables['c'].extend({'id': -i, 'name': f"x{i}", 'city': 'z', 'level': 0} for i in range(1, 100))
+    for row in tables['o'][::50]:
+        row['customer_id'] = None
+    return tables
+
+
+def digest(rows):
+    """逐行计算 (行数, 摘要)，不保留结果，峰值内存只反映连接和排序本身"""
+    sha = hashlib.sha1()
+    count = 0
+    for row in rows:
+        sha.update(pickle.dumps(row))
+        count += 1
+    return count, sha.hexdigest()
+
+
+def run_join(tables, join_type, budget):
+    return digest(JoinService.join_tables(tables, 'o', joins(join_type), budget))
+
+
+def run_query(tables, parsed, budget):
+    data = JoinService.join_tables(tables, 'o', joins('INNER'), budget)
+    result = {'table': 'merged_results', 'data': data}
+    request = parsed['tables'][0]['request'][0]
+    if 'limit' in request:
+        result['limit'] = request['limit']
+        result['offset'] = request.get('offset', 0)
+    return digest(MergeService.iter_results([result], parsed))
+
+
+def compare(label, func, budget):
+    """分别在不限制内存和限制内存时运行，返回结果是否一致"""
+    settings.QUERY_MEMORY_BUDGET = 0
+    expected, seconds, _, peak, _ = measure(lambda: func(None))
+    settings.QUERY_MEMORY_BUDGET = budget.limit
+    actual, spill_seconds, _, spill_peak, _ = measure(lambda: func(budget))
+    settings.QUERY_MEMORY_BUDGET = 0
+    same = actual == expected
+    print(
+        f"  {label:<44} 内存 {seconds * 1000:7.1f}ms 峰值 {peak / 2 ** 20:6.1f}MB  "
+        f"临时文件 {spill_seconds * 1000:7.1f}ms 峰值 {spill_peak / 2 ** 20:6.1f}MB  "
+        f"{actual[0]} 行  结果{'一致' if same else '不一致'}"
+    )
+    return same
+
+
+def main(sizes):
+    budget = MemoryBudget(BUDGET)
+    failures = 0
+    for size in sizes:
+        tables = make_sparse_tables(size)
+        estimate = MemoryBudget.estimate(tables['o'], len(tables['o']))
+        print(f"{size} 行订单 JOIN {len(tables['c'])} 行客户（订单约 {estimate / 2 ** 20:.1f}MB，预算 {BUDGET / 2 ** 20:.0f}MB）:")
+        for join_type in ('INNER', 'LEFT', 'RIGHT'):
+            failures += not compare(f"{join_type} JOIN", lambda b: run_join(tables, join_type, b), budget)
+        for sql in QUERIES:
+            parsed = SQLParser().parse_sql(sql)
+            failures += not compare(sql[-40:], lambda b: run_query(tables, parsed, b), budget)
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main([int(arg) for arg in sys.argv[1:]] or [200000]) else 0)
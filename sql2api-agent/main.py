@@ -1,9 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.api.endpoints import router
+from app.api.endpoints import router, cache_service
 from app.core.exceptions import setup_exception_handlers
+from app.services.http_client import http_client_manager
+from app.services.mapping_registry import mapping_registry
+from app.services.merge_pool import merge_pool
+from app.db.database import db_executor
 import uvicorn
 
-app = FastAPI(title="SQL to API Agent")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动共享HTTP连接池
+    await http_client_manager.startup()
+    # 预加载API映射
+    await mapping_registry.start()
+    # 启动合并计算进程池
+    await merge_pool.startup()
+    yield
+    await mapping_registry.stop()
+    await http_client_manager.shutdown()
+    await cache_service.close()
+    db_executor.shutdown(wait=False)
+    merge_pool.shutdown()
+
+
+app = FastAPI(title="SQL to API Agent", lifespan=lifespan)
 
 # 注册路由
 app.include_router(router)
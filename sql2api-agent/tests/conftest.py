@@ -0,0 +1,49 @@
+import asyncio
+import itertools
+import json
+import time
+
+import httpx
+import pytest
+
+from app.db.models import APIMapping
+from app.services.cache_service import LocalCache
+from app.services.http_client import http_client_manager
+from app.services.mapping_registry import CachedAPIMapping, mapping_registry
+from app.services.response_cache import response_cache
+
+_mapping_ids = itertools.count(1)
+
+
+@pytest.fixture
+def mock_upstream():
+    """把共享HTTP客户端换成 MockTransport，handler 接收 httpx.Request 返回 httpx.Response"""
+    def install(handler):
+        http_client_manager._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    yield install
+    asyncio.run(http_client_manager.shutdown())
+
+
+@pytest.fixture
+def mappings():
+    """向进程内注册表写入API映射，测试结束后恢复；子响应缓存每个测试重新开始"""
+    saved = mapping_registry._mappings, mapping_registry._loaded_at, response_cache._cache
+    mapping_registry._mappings = {}
+    mapping_registry._loaded_at = time.monotonic()
+    response_cache._cache = LocalCache(saved[2].max_bytes, ttl=2 ** 31)
+
+    def add(table_name: str, options: dict = None, method: str = 'POST') -> CachedAPIMapping:
+        template = {'_options': options} if options else {}
+        mapping = CachedAPIMapping(APIMapping(
+            id=next(_mapping_ids),
+            table_name=table_name,
+            api_url=f"http://upstream/{table_name}",
+            method=method,
+            request_template=json.dumps(template)
+        ))
+        mapping_registry._mappings[table_name] = mapping
+        return mapping
+
+    yield add
+    mapping_registry._mappings, mapping_registry._loaded_at, response_cache._cache = saved
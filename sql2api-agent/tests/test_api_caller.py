@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.api_caller import APICaller
+from app.services.http_client import http_client_manager
+
+API_CONFIG = {'url': 'http://upstream/orders', 'method': 'POST', 'template': {}}
+
+
+@pytest.fixture
+def upstream():
+    """模拟上游：记录收到的请求体，每个请求延迟一段时间后返回固定的行"""
+    requests = []
+
+    async def handler(request: httpx.Request):
+        requests.append(request.content)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={'data': [{'id': 1, 'amount': '1.50'}, {'id': 2, 'amount': '2.00'}]})
+
+    http_client_manager._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    yield requests
+    asyncio.run(http_client_manager.shutdown())
+
+
+def test_concurrent_identical_calls_share_one_upstream_call(upstream):
+    async def run():
+        return await asyncio.gather(*(APICaller().call_api_async(API_CONFIG, {'id': 1}) for _ in range(5)))
+
+    coalesced = APICaller.calls_coalesced
+    responses = asyncio.run(run())
+    assert len(upstream) == 1
+    assert APICaller.calls_coalesced - coalesced == 4
+    assert all(response == responses[0] for response in responses)
+    assert not APICaller._inflight
+
+
+def test_different_params_are_not_coalesced(upstream):
+    async def run():
+        return await asyncio.gather(*(APICaller().call_api_async(API_CONFIG, {'id': i}) for i in range(3)))
+
+    asyncio.run(run())
+    assert len(upstream) == 3
+
+
+def test_coalesced_waiters_get_their_own_copy(upstream):
+    """一个等待者就地修改响应，不影响其他等待者拿到的结果"""
+    async def call(index):
+        response = await APICaller().call_api_async(API_CONFIG, {'id': 1})
+        response['data'][0]['amount'] = index
+        response['data'].append({'id': index})
+        return response
+
+    async def run():
+        return await asyncio.gather(*(call(index) for index in range(3)))
+
+    responses = asyncio.run(run())
+    assert len(upstream) == 1
+    for index, response in enumerate(responses):
+        assert response['data'][0] == {'id': 1, 'amount': index}
+        assert response['data'][1:] == [{'id': 2, 'amount': '2.00'}, {'id': index}]
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call(upstream):
+    async def run():
+        first = asyncio.ensure_future(APICaller().call_api_async(API_CONFIG, {'id': 1}))
+        second = asyncio.ensure_future(APICaller().call_api_async(API_CONFIG, {'id': 1}))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    response, cancelled = asyncio.run(run())
+    assert cancelled
+    assert response['data'][0]['id'] == 1
+    assert len(upstream) == 1
+
+
+def test_coalescing_can_be_disabled(upstream, monkeypatch):
+    monkeypatch.setattr(settings, 'API_COALESCE_REQUESTS', False)
+
+    async def run():
+        return await asyncio.gather(*(APICaller().call_api_async(API_CONFIG, {'id': 1}) for _ in range(3)))
+
+    asyncio.run(run())
+    assert len(upstream) == 3
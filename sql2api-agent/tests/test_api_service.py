@@ -0,0 +1,167 @@
+import asyncio
+import json
+from decimal import Decimal
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.api_service import APIService
+from app.services.merge_service import MergeService
+from app.services.pagination import Pagination
+from app.services.response_cache import response_cache
+from app.services.sql_parser import SQLParser
+
+ORDERS = [{'id': i, 'amount': f"{i}.50"} for i in range(10)]
+PAGED_DECIMAL = {'pagination': {'style': 'offset', 'page_size': 2}, 'columns': {'amount': 'decimal'}}
+
+
+def paged_upstream(rows, requests=None, delay=0.0):
+    """offset分页的上游：按请求体中的 limit/offset 返回 rows 的切片"""
+    async def handler(request: httpx.Request):
+        body = json.loads(request.content)
+        if requests is not None:
+            requests.append(body)
+        await asyncio.sleep(delay)
+        start = body['offset']
+        return httpx.Response(200, json={'data': rows[start:start + body['limit']]})
+    return handler
+
+
+async def query(sql: str):
+    parsed = SQLParser().parse_sql(sql)
+    results, error = await APIService().execute_api_calls(
+        parsed['tables'], parsed['join_conditions'], None, parsed['where_conditions']
+    )
+    if error:
+        return error
+    return await MergeService.merge_results(results, parsed)
+
+
+def test_paged_limit_does_not_modify_upstream_response(mappings):
+    """分页计数时按列类型转换的是副本，上游响应（可能被其他调用方共享）保持原值"""
+    mapping = mappings('orders', PAGED_DECIMAL)
+    response = {'data': [dict(row) for row in ORDERS[:2]]}
+
+    class SharedResponse(APIService):
+        def _make_api_call(self, api_mapping, api_config, params):
+            async def call():
+                return response
+            return call
+
+    parsed = SQLParser().parse_sql("SELECT id FROM orders WHERE amount > 1 LIMIT 1")
+    rows = asyncio.run(SharedResponse()._fetch_pages(
+        mapping, Pagination(PAGED_DECIMAL['pagination']), {}, 1, parsed['where_conditions']
+    ))
+    assert [row['amount'] for row in rows] == [Decimal('0.50'), Decimal('1.50')]
+    assert response == {'data': ORDERS[:2]}
+
+
+def test_concurrent_paged_queries_sharing_an_upstream_call(mappings, mock_upstream):
+    """不同SQL的相同分页请求合并为一次上游调用，各自按列类型转换后子响应缓存仍可写入"""
+    mappings('orders', PAGED_DECIMAL)
+    requests = []
+    mock_upstream(paged_upstream(ORDERS, requests, delay=0.05))
+
+    async def run():
+        return await asyncio.gather(
+            query("SELECT id, amount FROM orders WHERE amount > 1 LIMIT 2"),
+            query("SELECT amount, id FROM orders WHERE amount > 3 LIMIT 2"),
+        )
+
+    first, second = asyncio.run(run())
+    assert first == [{'id': 1, 'amount': Decimal('1.50')}, {'id': 2, 'amount': Decimal('2.50')}]
+    assert second == [{'amount': Decimal('3.50'), 'id': 3}, {'amount': Decimal('4.50'), 'id': 4}]
+    assert [body['offset'] for body in requests] == [0, 2, 4]
+    # 子响应缓存中是上游的原始值
+    cached = [json.loads(entry[0]) for entry in response_cache._cache._entries.values()]
+    assert cached == [{'data': ORDERS[0:2]}, {'data': ORDERS[2:4]}, {'data': ORDERS[4:6]}]
+
+
+def test_response_cache_accepts_converted_values(mappings):
+    response_cache.set('key', {'data': [{'amount': Decimal('1.50')}]}, 60)
+    assert response_cache.get('key') == {'data': [{'amount': '1.50'}]}
+
+
+def test_bind_join_sends_json_keys_for_typed_join_columns(mappings, mock_upstream, monkeypatch):
+    """驱动表的连接字段按列类型转换为日期后，按连接键查询时仍以ISO字符串作为请求参数"""
+    monkeypatch.setattr(settings, 'JOIN_STRATEGY', 'bind')
+    mappings('orders', {'columns': {'day': 'date'}})
+    mappings('rates', {'columns': {'day': 'date', 'rate': 'decimal'}})
+    rate_requests = []
+
+    async def handler(request: httpx.Request):
+        body = json.loads(request.content)
+        if request.url.path == '/orders':
+            return httpx.Response(200, json={'data': [
+                {'id': 1, 'day': '2024-01-02'}, {'id': 2, 'day': '2024-01-03'}, {'id': 3, 'day': '2024-01-02'}
+            ]})
+        rate_requests.append(body)
+        return httpx.Response(200, json={'data': [{'day': body['day'], 'rate': f"1.{body['day'][-1]}"}]})
+
+    mock_upstream(handler)
+    rows = asyncio.run(query("SELECT o.id, r.rate FROM orders o JOIN rates r ON o.day = r.day"))
+    assert rate_requests == [{'day': '2024-01-02'}, {'day': '2024-01-03'}]
+    assert rows == [
+        {'id': 1, 'rate': Decimal('1.2')}, {'id': 2, 'rate': Decimal('1.3')}, {'id': 3, 'rate': Decimal('1.2')}
+    ]
+
+
+def fetched_offsets(mappings, mock_upstream, sql: str, pagination: dict = None):
+    """执行单表查询，返回 (结果, 按顺序请求的各页offset)"""
+    mappings('orders', {**PAGED_DECIMAL, 'pagination': {**PAGED_DECIMAL['pagination'], **(pagination or {})}})
+    requests = []
+    mock_upstream(paged_upstream(ORDERS, requests))
+    rows = asyncio.run(query(sql))
+    return rows, [body['offset'] for body in requests]
+
+
+def test_paged_limit_stops_after_enough_rows(mappings, mock_upstream):
+    rows, offsets = fetched_offsets(mappings, mock_upstream, "SELECT id, amount FROM orders LIMIT 3")
+    assert [row['id'] for row in rows] == [0, 1, 2]
+    assert offsets == [0, 2]
+
+
+def test_paged_limit_counts_rows_after_local_filter(mappings, mock_upstream):
+    """本地条件按列类型（decimal）比较，过滤后的行数满足 LIMIT+OFFSET 时停止"""
+    rows, offsets = fetched_offsets(
+        mappings, mock_upstream, "SELECT id, amount FROM orders WHERE amount > 3 LIMIT 2 OFFSET 1"
+    )
+    assert rows == [{'id': 4, 'amount': Decimal('4.50')}, {'id': 5, 'amount': Decimal('5.50')}]
+    assert offsets == [0, 2, 4]
+
+
+@pytest.mark.parametrize('sql, ids', [
+    ("SELECT id, amount FROM orders WHERE amount > 3 ORDER BY amount DESC LIMIT 2", [9, 8]),
+    ("SELECT id, amount FROM orders WHERE amount > 3", [3, 4, 5, 6, 7, 8, 9]),
+])
+def test_paged_query_without_early_stop_fetches_all_pages(mappings, mock_upstream, sql, ids):
+    """有本地排序或没有LIMIT时获取全部页，直到返回不满一页"""
+    rows, offsets = fetched_offsets(mappings, mock_upstream, sql)
+    assert offsets == [0, 2, 4, 6, 8, 10]
+    assert [row['id'] for row in rows] == ids
+
+
+def test_paged_fetch_stops_at_max_pages(mappings, mock_upstream):
+    rows, offsets = fetched_offsets(mappings, mock_upstream, "SELECT id, amount FROM orders", {'max_pages': 2})
+    assert offsets == [0, 2]
+    assert [row['id'] for row in rows] == [0, 1, 2, 3]
+
+
+def test_cursor_paged_fetch_follows_next_cursor(mappings, mock_upstream):
+    mappings('orders', {'pagination': {'style': 'cursor', 'page_size': 4, 'cursor_field': 'next'}})
+    cursors = []
+
+    async def handler(request: httpx.Request):
+        body = json.loads(request.content)
+        cursors.append(body.get('cursor'))
+        start = int(body.get('cursor') or 0)
+        end = start + body['page_size']
+        return httpx.Response(200, json={
+            'data': ORDERS[start:end], 'next': str(end) if end < len(ORDERS) else None
+        })
+
+    mock_upstream(handler)
+    rows = asyncio.run(query("SELECT id, amount FROM orders"))
+    assert cursors == [None, '4', '8']
+    assert [row['id'] for row in rows] == list(range(10))
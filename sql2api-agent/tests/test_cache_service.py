@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import orjson
+import pytest
+
+from app.services.cache_service import CacheService, decode_entry, encode_value
+
+EXPIRE = 10
+STALE_TTL = 60
+
+
+class FakeRedis:
+    """只支持结果缓存用到的命令：pipeline(get, ttl) 和 set(ex=)"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return FakePipeline(self)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.results = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def get(self, key):
+        self.results.append(self.redis.data.get(key))
+
+    def ttl(self, key):
+        self.results.append(self.redis.ttls.get(key, -2))
+
+    async def execute(self):
+        return self.results
+
+
+@pytest.fixture
+def cache():
+    service = CacheService()
+    service.redis_client = FakeRedis()
+    service.default_expire = EXPIRE
+    service.stale_ttl = STALE_TTL
+    return service
+
+
+class Loader:
+    """记录调用次数的loader，可设置返回值、异常和耗时"""
+
+    def __init__(self, value=None, error: Exception = None, delay: float = 0.0):
+        self.value = value
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def seed_stale(cache: CacheService, key: str, value, redis_only: bool = False):
+    """写入一条已过新鲜期、仍在 CACHE_STALE_TTL 内的缓存"""
+    payload = orjson.dumps(value)
+    stored_at = time.time() - EXPIRE - 1
+    if not redis_only:
+        cache.local_cache.set(key, payload, stored_at, STALE_TTL)
+    cache.redis_client.data[key] = encode_value(payload, stored_at, 0)
+    cache.redis_client.ttls[key] = STALE_TTL
+
+
+async def drain(cache: CacheService):
+    """等待后台刷新和Redis写入完成"""
+    while cache._inflight or cache._background:
+        await asyncio.gather(*cache._inflight.values(), *cache._background)
+
+
+def test_concurrent_misses_load_once(cache):
+    loader = Loader([{'id': 1}], delay=0.05)
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_or_load('key', loader) for _ in range(3)))
+        await drain(cache)
+        return results, await cache.get_or_load('key', loader)
+
+    results, cached = asyncio.run(run())
+    assert results == [([{'id': 1}], False, False)] * 3
+    assert cached == ([{'id': 1}], True, False)
+    assert loader.calls == 1
+    assert cache.coalesced == 2
+    assert cache.redis_client.ttls['key'] == EXPIRE + STALE_TTL
+
+
+def test_loader_error_is_not_cached(cache):
+    failing = Loader(error=RuntimeError('upstream'), delay=0.01)
+
+    async def run():
+        results = await asyncio.gather(
+            cache.get_or_load('key', failing), cache.get_or_load('key', failing), return_exceptions=True
+        )
+        return results, await cache.get_or_load('key', Loader([1]))
+
+    results, retried = asyncio.run(run())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert failing.calls == 1
+    assert retried == ([1], False, False)
+
+
+def test_stale_entry_is_served_and_refreshed_once(cache):
+    seed_stale(cache, 'key', ['old'])
+    loader = Loader(['new'], delay=0.01)
+
+    async def run():
+        results = await asyncio.gather(cache.get_or_load('key', loader), cache.get_or_load('key', loader))
+        await drain(cache)
+        return results, await cache.get_or_load('key', loader)
+
+    results, refreshed = asyncio.run(run())
+    assert results == [(['old'], True, True)] * 2
+    assert refreshed == (['new'], True, False)
+    assert loader.calls == 1
+    assert (cache.stale_served, cache.refreshes, cache.refresh_errors) == (2, 1, 0)
+    assert orjson.loads(decode_entry(cache.redis_client.data['key'])[0]) == ['new']
+
+
+def test_failed_refresh_keeps_stale_value(cache):
+    seed_stale(cache, 'key', ['old'])
+    failing = Loader(error=RuntimeError('upstream'))
+
+    async def run():
+        first = await cache.get_or_load('key', failing)
+        await drain(cache)
+        return first, await cache.get_or_load('key', failing)
+
+    first, second = asyncio.run(run())
+    assert first == second == (['old'], True, True)
+    assert cache.refresh_errors == 1
+
+
+def test_stale_entry_from_redis_is_served_and_refreshed(cache):
+    """进程内缓存没有时从Redis读取，保留原写入时间判断是否过期"""
+    seed_stale(cache, 'key', ['old'], redis_only=True)
+    loader = Loader(['new'])
+
+    async def run():
+        assert await cache.get_fresh('key') is None
+        result = await cache.get_or_load('key', loader)
+        await drain(cache)
+        return result, await cache.get_fresh('key')
+
+    result, fresh = asyncio.run(run())
+    assert result == (['old'], True, True)
+    assert fresh == ['new']
+    assert loader.calls == 1
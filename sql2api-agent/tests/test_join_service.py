@@ -0,0 +1,158 @@
+import asyncio
+import random
+from operator import itemgetter
+
+import pytest
+
+from app.core.exceptions import SQLParseError
+from app.models.sql_models import JoinCondition
+from app.services.join_service import JOIN_TYPES, JoinService
+from app.services.merge_service import MergeService
+from app.services.sql_parser import SQLParser
+
+ORDERS = [
+    {'id': 1, 'customer_id': 10, 'amount': 100},
+    {'id': 2, 'customer_id': 20, 'amount': 200},
+    {'id': 3, 'customer_id': 99, 'amount': 111},
+    {'id': 4, 'customer_id': None, 'amount': 148},
+]
+CUSTOMERS = [
+    {'cid': 10, 'cname': 'C1'},
+    {'cid': 20, 'cname': 'C2'},
+    {'cid': 30, 'cname': 'C3'},
+]
+
+
+def key_of(*columns):
+    get = itemgetter(*columns)
+
+    def key(row):
+        value = get(row)
+        return None if value is None or (isinstance(value, tuple) and None in value) else value
+    return key
+
+
+def nested_loop(left, right, left_key, right_key, join_type):
+    """按定义逐对比较的参考实现"""
+    pairs = []
+    right_matched = [False] * len(right)
+    for left_row in left:
+        matched = False
+        for index, right_row in enumerate(right):
+            key = left_key(left_row)
+            if key is not None and key == right_key(right_row):
+                pairs.append((left_row, right_row))
+                right_matched[index] = matched = True
+        if not matched and join_type == 'LEFT':
+            pairs.append((left_row, None))
+    if join_type == 'RIGHT':
+        pairs.extend((None, row) for index, row in enumerate(right) if not right_matched[index])
+    return pairs
+
+
+def joins(join_type='INNER', left='o', left_column='customer_id', right='c', right_column='cid', sequence=1):
+    return [JoinCondition(
+        leftTable=left, leftColumn=left_column, rightTable=right, rightColumn=right_column,
+        sequence=sequence, joinType=join_type
+    )]
+
+
+def query(sql, tables):
+    """按SQL的JOIN条件连接各表数据后合并"""
+    parsed = SQLParser().parse_sql(sql)
+    data = JoinService.join_tables(tables, parsed['tables'][0]['alias'], parsed['join_conditions'])
+    return asyncio.run(MergeService.merge_results([{'table': 'merged_results', 'data': data}], parsed))
+
+
+@pytest.mark.parametrize('join_type', JOIN_TYPES)
+def test_hash_join_matches_nested_loop(join_type):
+    """两侧大小不同（分别在左侧、右侧建表），含NULL键和重复键，输出及顺序与嵌套循环一致"""
+    rng = random.Random(join_type)
+    for _ in range(200):
+        left = [{'a': rng.choice([None, *range(5)]), 'b': rng.randrange(2), 'i': i} for i in range(rng.randrange(15))]
+        right = [{'a': rng.choice([None, *range(5)]), 'b': rng.randrange(2), 'j': j} for j in range(rng.randrange(15))]
+        left_key = right_key = key_of('a', 'b')
+        assert JoinService.hash_join(left, right, left_key, right_key, join_type) == \
+            nested_loop(left, right, left_key, right_key, join_type)
+
+
+def test_null_keys_never_match():
+    left = [{'k': None}, {'k': 1}]
+    right = [{'k': None}, {'k': 1}]
+    pairs = JoinService.hash_join(left, right, key_of('k'), key_of('k'), 'INNER')
+    assert pairs == [({'k': 1}, {'k': 1})]
+
+
+def test_unsupported_join_type_is_rejected():
+    with pytest.raises(ValueError):
+        JoinService.hash_join([], [], key_of('k'), key_of('k'), 'FULL')
+    with pytest.raises(SQLParseError):
+        SQLParser().parse_sql("SELECT o.id FROM orders o FULL OUTER JOIN customers c ON o.customer_id = c.cid")
+
+
+def test_inner_join():
+    rows = query(
+        "SELECT o.id, o.amount, c.cname FROM orders o JOIN customers c ON o.customer_id = c.cid",
+        {'o': ORDERS, 'c': CUSTOMERS}
+    )
+    assert rows == [{'id': 1, 'amount': 100, 'cname': 'C1'}, {'id': 2, 'amount': 200, 'cname': 'C2'}]
+
+
+def test_left_join_returns_null_for_unmatched_columns():
+    rows = query(
+        "SELECT o.id, o.amount, c.cname FROM orders o LEFT JOIN customers c ON o.customer_id = c.cid",
+        {'o': ORDERS, 'c': CUSTOMERS}
+    )
+    assert rows == [
+        {'id': 1, 'amount': 100, 'cname': 'C1'},
+        {'id': 2, 'amount': 200, 'cname': 'C2'},
+        {'id': 3, 'amount': 111, 'cname': None},
+        {'id': 4, 'amount': 148, 'cname': None},
+    ]
+
+
+def test_right_join_returns_null_for_unmatched_columns():
+    rows = query(
+        "SELECT o.amount, c.cname FROM orders o RIGHT JOIN customers c ON o.customer_id = c.cid",
+        {'o': ORDERS, 'c': CUSTOMERS}
+    )
+    assert rows == [
+        {'amount': 100, 'cname': 'C1'},
+        {'amount': 200, 'cname': 'C2'},
+        {'amount': None, 'cname': 'C3'},
+    ]
+
+
+def test_left_join_select_all_has_the_same_keys_in_every_row():
+    data = JoinService.join_tables({'o': ORDERS, 'c': CUSTOMERS}, 'o', joins('LEFT'))
+    rows = [data.project(values, None) for values in data]
+    assert {tuple(row) for row in rows} == {('id', 'customer_id', 'amount', 'cid', 'cname')}
+    assert [(row['id'], row['cid'], row['cname']) for row in rows] == \
+        [(1, 10, 'C1'), (2, 20, 'C2'), (3, None, None), (4, None, None)]
+
+
+def test_duplicate_column_falls_back_to_earlier_table_when_unmatched():
+    """同名字段以后加入的表为准，后加入的表未匹配时取先加入的表的值"""
+    customers = [{'id': row['cid'], 'cname': row['cname']} for row in CUSTOMERS]
+    data = JoinService.join_tables(
+        {'o': ORDERS, 'c': customers}, 'o', joins('LEFT', right_column='id')
+    )
+    assert [(row['id'], row['cname']) for row in data.to_dicts()] == [(10, 'C1'), (20, 'C2'), (3, None), (4, None)]
+
+
+def test_join_condition_written_from_the_new_table_side():
+    """ON 条件的左侧是新加入的表时，仍按已连接的表查找连接键"""
+    items = [{'oid': 2, 'sku': 'b'}, {'oid': 1, 'sku': 'a'}, {'oid': 1, 'sku': 'c'}]
+    data = JoinService.join_tables(
+        {'o': ORDERS, 'i': items}, 'o', joins(left='i', left_column='oid', right='o', right_column='id')
+    )
+    assert [(row['amount'], row['sku']) for row in data.to_dicts()] == [(100, 'a'), (100, 'c'), (200, 'b')]
+
+
+def test_multi_column_join_key():
+    left = [{'a': 1, 'b': 1, 'x': 'l1'}, {'a': 1, 'b': 2, 'x': 'l2'}]
+    right = [{'a': 1, 'b': 2, 'y': 'r1'}, {'a': 1, 'b': 3, 'y': 'r2'}]
+    conditions = joins(left='l', left_column='a', right='r', right_column='a') + \
+        joins(left='l', left_column='b', right='r', right_column='b')
+    data = JoinService.join_tables({'l': left, 'r': right}, 'l', conditions)
+    assert data.to_dicts() == [{'a': 1, 'b': 2, 'x': 'l2', 'y': 'r1'}]
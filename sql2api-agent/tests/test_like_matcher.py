@@ -0,0 +1,108 @@
+import random
+from functools import lru_cache
+
+import pytest
+
+from app.services.like_matcher import LikePattern
+from app.services.merge_service import MergeService
+from app.services.sql_parser import SQLParser
+
+CASES = [
+    # (模式, 值, 是否匹配)
+    ('abc%', 'ABCdef', True),
+    ('abc%', 'xabc', False),
+    ('%abc', 'xxABC', True),
+    ('%abc', 'abcx', False),
+    ('%abc%', 'xAbCx', True),
+    ('abc', 'abc', True),
+    ('abc', 'xabcx', False),
+    ('a_c', 'abc', True),
+    ('a_c', 'abbc', False),
+    ('a%c%e', 'abcde', True),
+    ('a%c%e', 'abcdef', False),
+    ('%', '', True),
+    ('', '', True),
+    ('', 'a', False),
+    ('100\\%', '100%', True),
+    ('100\\%', '1000', False),
+    ('a\\_b', 'a_b', True),
+    ('a\\_b', 'axb', False),
+    ('a.c', 'abc', False),
+    ('%2024-01%', '2024-01-15', True),
+    ('line%', 'line1\nline2', True),
+    ('%abc%', None, False),
+    ('%', None, False),
+    ('12%', 123, True),
+]
+
+
+def reference_like(pattern: str, value) -> bool:
+    """按定义逐字符匹配的参考实现"""
+    if value is None:
+        return False
+    tokens = []
+    chars = iter(pattern)
+    for char in chars:
+        if char == '\\':
+            tokens.append(('lit', next(chars, '\\').lower()))
+        elif char in ('%', '_'):
+            tokens.append((char, None))
+        else:
+            tokens.append(('lit', char.lower()))
+    text = str(value).lower()
+
+    @lru_cache(maxsize=None)
+    def match(i: int, j: int) -> bool:
+        if i == len(tokens):
+            return j == len(text)
+        kind, char = tokens[i]
+        if kind == '%':
+            return any(match(i + 1, k) for k in range(j, len(text) + 1))
+        if j == len(text):
+            return False
+        return (kind == '_' or text[j] == char) and match(i + 1, j + 1)
+
+    return match(0, 0)
+
+
+@pytest.mark.parametrize('pattern, value, expected', CASES)
+def test_cases(pattern, value, expected):
+    assert LikePattern(pattern).match(value) is expected
+
+
+@pytest.mark.parametrize('pattern, kind, text', [
+    ('%', 'any', None),
+    ('%%', 'any', None),
+    ('abc', 'exact', 'abc'),
+    ('Abc%', 'prefix', 'Abc'),
+    ('%abc', 'suffix', 'abc'),
+    ('%a\\%c%', 'contains', 'a%c'),
+    ('a_c', 'regex', None),
+    ('a%c%e', 'regex', None),
+])
+def test_kind(pattern, kind, text):
+    compiled = LikePattern(pattern)
+    assert compiled.kind == kind
+    assert compiled.text == text
+
+
+def test_random_patterns_match_reference():
+    rng = random.Random(0)
+    for _ in range(5000):
+        pattern = ''.join(rng.choice('aAb%_\\') for _ in range(rng.randrange(6)))
+        value = ''.join(rng.choice('aAb%_') for _ in range(rng.randrange(6)))
+        assert LikePattern(pattern).match(value) == reference_like(pattern, value), (pattern, value)
+
+
+def test_filter_by_like_conditions():
+    rows = [
+        {'id': 1, 'name': 'user_1', 'email': 'a@example.com'},
+        {'id': 2, 'name': 'user12', 'email': 'b@mail.com'},
+        {'id': 3, 'name': 'USER_3', 'email': 'c@example.com'},
+        {'id': 4, 'name': None, 'email': 'd@example.com'},
+    ]
+    parsed = SQLParser().parse_sql(
+        "SELECT id FROM users WHERE name LIKE 'user\\_%' AND email LIKE '%@example.com'"
+    )
+    conditions = [c for c in parsed['where_conditions'] if c.operator == 'LIKE']
+    assert [row['id'] for row in MergeService.filter_by_conditions(rows, conditions)] == [1, 3]
@@ -0,0 +1,43 @@
+import pytest
+
+from app.services.pagination import Pagination
+
+
+def test_offset_page_params():
+    pagination = Pagination({'style': 'offset', 'page_size': 50, 'offset_param': 'skip'})
+    assert pagination.page_params(0) == {'limit': 50, 'skip': 0}
+    assert pagination.page_params(2) == {'limit': 50, 'skip': 100}
+
+
+def test_page_number_params():
+    pagination = Pagination({'style': 'page', 'page_size': 20, 'page_param': 'pageNo', 'size_param': 'pageSize'})
+    assert pagination.page_params(0) == {'pageNo': 1, 'pageSize': 20}
+    assert pagination.page_params(3) == {'pageNo': 4, 'pageSize': 20}
+    assert Pagination({'style': 'page', 'start_page': 0}).page_params(1)['page'] == 1
+
+
+def test_cursor_params_and_next_cursor():
+    pagination = Pagination({'style': 'cursor', 'page_size': 10, 'cursor_field': 'meta.next'})
+    assert pagination.page_params(0) == {'page_size': 10}
+    assert pagination.page_params(1, 'abc') == {'page_size': 10, 'cursor': 'abc'}
+    assert pagination.next_cursor({'meta': {'next': 'abc'}}) == 'abc'
+    assert pagination.next_cursor({'meta': {'next': ''}}) is None
+    assert pagination.next_cursor({'meta': None}) is None
+    assert pagination.next_cursor([{'id': 1}]) is None
+
+
+def test_is_last_page():
+    offset = Pagination({'style': 'offset', 'page_size': 2})
+    assert offset.is_last_page([], None)
+    assert offset.is_last_page([{'id': 1}], None)
+    assert not offset.is_last_page([{'id': 1}, {'id': 2}], None)
+    cursor = Pagination({'style': 'cursor', 'page_size': 2})
+    assert cursor.is_last_page([{'id': 1}, {'id': 2}], None)
+    assert not cursor.is_last_page([{'id': 1}], 'next')
+
+
+def test_from_options():
+    assert Pagination.from_options({}) is None
+    assert Pagination.from_options({'pagination': {'max_pages': 0}}).max_pages == 1
+    with pytest.raises(ValueError):
+        Pagination.from_options({'pagination': {'style': 'link'}})
@@ -0,0 +1,59 @@
+from app.services.plan_cache import PlanCache, canonical_plan, normalize_sql
+from app.services.sql_parser import SQLParser
+
+
+def canonical(sql: str):
+    return canonical_plan(SQLParser().parse_sql(sql))
+
+
+def test_normalize_sql_keeps_string_literals():
+    assert normalize_sql("SELECT  id\n FROM t WHERE name = 'a  b' ;") == "SELECT id FROM t WHERE name = 'a  b'"
+
+
+def test_and_conditions_in_any_order_share_a_key():
+    assert canonical("SELECT id, name FROM users WHERE age > 18 AND status = 'active'") == \
+        canonical("SELECT id, name FROM users WHERE status = 'active' AND age > 18")
+
+
+def test_in_values_in_any_order_share_a_key():
+    assert canonical("SELECT id, name FROM users WHERE id IN (3, 1, 2)") == \
+        canonical("SELECT id, name FROM users WHERE id IN (1, 2, 3)")
+
+
+def test_duplicate_in_values_do_not_share_a_key():
+    """每个IN值一个上游请求，重复的值返回重复的行，不能与去重后的SQL共用结果"""
+    sql = "SELECT id, name FROM users WHERE id IN (1, 1, 2)"
+    assert len(SQLParser().parse_sql(sql)['tables'][0]['request']) == 3
+    assert canonical(sql) != canonical("SELECT id, name FROM users WHERE id IN (1, 2)")
+    assert canonical(sql) == canonical("SELECT id, name FROM users WHERE id IN (1, 2, 1)")
+
+
+def test_join_condition_sides_are_interchangeable():
+    assert canonical("SELECT o.id, c.name FROM orders o JOIN customers c ON o.customer_id = c.id") == \
+        canonical("SELECT o.id, c.name FROM orders o JOIN customers c ON c.id = o.customer_id")
+
+
+def test_select_and_order_by_order_are_kept():
+    assert canonical("SELECT id, name FROM users") != canonical("SELECT name, id FROM users")
+    assert canonical("SELECT id, name FROM users ORDER BY name, id") != \
+        canonical("SELECT id, name FROM users ORDER BY id, name")
+
+
+def test_limit_without_order_by_keeps_condition_order():
+    """有LIMIT但没有ORDER BY时，IN值的顺序决定返回哪些行"""
+    assert canonical("SELECT id, name FROM users WHERE id IN (1, 2) LIMIT 1") != \
+        canonical("SELECT id, name FROM users WHERE id IN (2, 1) LIMIT 1")
+    assert canonical("SELECT id, name FROM users WHERE id IN (1, 2) ORDER BY id LIMIT 1") == \
+        canonical("SELECT id, name FROM users WHERE id IN (2, 1) ORDER BY id LIMIT 1")
+
+
+def test_plan_cache_returns_copies_and_evicts_least_recently_used():
+    cache = PlanCache(2)
+    cache.set('a', {'rows': [1]})
+    cache.get('a')['rows'].append(2)
+    assert cache.get('a') == {'rows': [1]}
+    cache.set('b', {})
+    cache.get('a')
+    cache.set('c', {})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+from app.core.config import settings
+from app.models.sql_models import JoinCondition
+from app.services.join_service import JoinService
+from app.services.merge_service import MergeService
+from app.services.spill import MemoryBudget, SpillFile
+from app.services.sql_parser import SQLParser
+
+# 远小于测试数据的预算，连接和排序都使用临时文件
+BUDGET = 16 * 1024
+
+
+def make_tables(count: int):
+    """部分订单没有对应客户、部分客户没有订单，且有NULL连接键和重复的排序键"""
+    rng = random.Random(count)
+    orders = [
+        {
+            'id': i,
+            'customer_id': None if i % 50 == 0 else rng.randrange(count // 4),
+            'amount': rng.randrange(100),
+            'status': rng.choice(['open', 'paid', 'closed'])
+        }
+        for i in range(count)
+    ]
+    customers = [
+        {'cid': i, 'name': f"c{i}", 'city': rng.choice('abc')}
+        for i in range(-20, count // 4) if i % 7
+    ]
+    return {'o': orders, 'c': customers}
+
+
+def joins(join_type: str):
+    return [JoinCondition(
+        leftTable='o', leftColumn='customer_id', rightTable='c', rightColumn='cid', sequence=1, joinType=join_type
+    )]
+
+
+def test_spill_file_round_trip():
+    rows = [{'id': i, 'name': f"n{i}"} for i in range(1000)]
+    spill_file = SpillFile.of(rows[:600])
+    assert list(spill_file) == rows[:600]
+    # 读取后可继续追加，多次读取结果相同
+    spill_file.extend(rows[600:])
+    assert len(spill_file) == len(rows)
+    assert list(spill_file) == rows
+    assert list(spill_file) == rows
+    spill_file.close()
+
+
+def test_external_sort_is_stable_and_matches_sorted():
+    rng = random.Random(0)
+    rows = [(rng.randrange(50), i) for i in range(5000)]
+    key = lambda row: row[0]
+
+    def sort_in_memory(chunk):
+        raise AssertionError("超出预算时不应整体在内存中排序")
+
+    assert list(MemoryBudget(BUDGET).sort(rows, key, sort_in_memory)) == sorted(rows, key=key)
+
+
+def test_sort_within_budget_stays_in_memory():
+    rows = [(3,), (1,), (2,)]
+    assert list(MemoryBudget(BUDGET).sort(rows, None, sorted)) == [(1,), (2,), (3,)]
+
+
+@pytest.mark.parametrize('join_type', ['INNER', 'LEFT', 'RIGHT'])
+def test_partitioned_join_matches_in_memory_join(join_type):
+    tables = make_tables(4000)
+    expected = JoinService.join_tables(tables, 'o', joins(join_type)).to_dicts()
+    budget = MemoryBudget(BUDGET)
+    assert budget.exceeded(tables['o'], tables['c'])
+    assert JoinService.join_tables(tables, 'o', joins(join_type), budget).to_dicts() == expected
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT o.id, o.amount, c.name FROM orders o JOIN customers c ON o.customer_id = c.cid ORDER BY amount DESC, id",
+    "SELECT o.id, o.amount, c.city FROM orders o JOIN customers c ON o.customer_id = c.cid "
+    "WHERE o.status != 'open' ORDER BY city, amount DESC LIMIT 100 OFFSET 20",
+    "SELECT * FROM orders o JOIN customers c ON o.customer_id = c.cid WHERE o.amount > 50",
+])
+def test_query_with_memory_budget_matches_unlimited(sql, monkeypatch):
+    tables = make_tables(4000)
+    parsed = SQLParser().parse_sql(sql)
+
+    def run():
+        budget = MemoryBudget.from_settings()
+        result = {'table': 'merged_results', 'data': JoinService.join_tables(tables, 'o', joins('INNER'), budget)}
+        request = parsed['tables'][0]['request'][0]
+        if 'limit' in request:
+            result['limit'] = request['limit']
+            result['offset'] = request.get('offset', 0)
+        return list(MergeService.iter_results([result], parsed))
+
+    monkeypatch.setattr(settings, 'QUERY_MEMORY_BUDGET', 0)
+    expected = run()
+    monkeypatch.setattr(settings, 'QUERY_MEMORY_BUDGET', BUDGET)
+    assert run() == expected
+    assert expected
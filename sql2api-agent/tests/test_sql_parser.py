@@ -0,0 +1,85 @@
+import logging
+
+import pytest
+
+from app.core.exceptions import SQLParseError
+from app.services.plan_cache import plan_cache
+from app.services.sql_parser import SQLParser
+
+UNSUPPORTED = "SELECT o.id FROM orders o FULL JOIN customers c ON o.customer_id = c.id"
+
+
+@pytest.fixture(autouse=True)
+def empty_plan_cache():
+    plan_cache.clear()
+    plan_cache.hits = plan_cache.misses = 0
+    yield
+    plan_cache.clear()
+
+
+def cold_parse(sql: str):
+    """关闭计划缓存完整解析"""
+    max_size = plan_cache.max_size
+    plan_cache.max_size = 0
+    try:
+        return SQLParser().parse_sql(sql)
+    finally:
+        plan_cache.max_size = max_size
+
+
+def lookups():
+    return plan_cache.hits, plan_cache.misses
+
+
+def test_template_bind_matches_cold_parse():
+    SQLParser().parse_sql(
+        "SELECT o.id, c.name FROM orders o JOIN customers c ON o.customer_id = c.id "
+        "WHERE o.id IN (1, 2) AND c.city = 'a' ORDER BY o.amount DESC LIMIT 20"
+    )
+    sql = (
+        "SELECT o.id, c.name FROM orders o JOIN customers c ON o.customer_id = c.id "
+        "WHERE o.id IN (7, 8, 9) AND c.city = 'b' ORDER BY o.amount DESC LIMIT 20"
+    )
+    parsed = SQLParser().parse_sql(sql)
+    assert lookups() == (1, 1)
+    assert parsed == cold_parse(sql)
+    assert [request['id'] for request in parsed['tables'][0]['request']] == ['7', '8', '9']
+
+
+def test_different_limit_is_a_different_template():
+    SQLParser().parse_sql("SELECT id, name FROM users WHERE age > 1 LIMIT 10")
+    parsed = SQLParser().parse_sql("SELECT id, name FROM users WHERE age > 1 LIMIT 20")
+    assert lookups() == (0, 2)
+    assert parsed['tables'][0]['request'][0]['limit'] == '20'
+
+
+def test_unbindable_sql_counts_one_lookup_per_parse():
+    sql = "SELECT id, name FROM users ORDER BY 1"
+    first = SQLParser().parse_sql(sql)
+    assert lookups() == (0, 1)
+    assert SQLParser().parse_sql(sql) == first
+    assert lookups() == (1, 1)
+
+
+def test_parse_failure_is_parsed_and_logged_once(monkeypatch, caplog):
+    calls = []
+    parse_structure = SQLParser._parse_structure
+
+    def counting(self, sql):
+        calls.append(sql)
+        return parse_structure(self, sql)
+
+    monkeypatch.setattr(SQLParser, '_parse_structure', counting)
+    with caplog.at_level(logging.ERROR, logger='sql2api'):
+        with pytest.raises(SQLParseError, match='FULL JOIN'):
+            SQLParser().parse_sql(UNSUPPORTED)
+        errors = [record for record in caplog.records if record.levelno >= logging.ERROR]
+        assert len(errors) == 1
+
+        # 解析失败的SQL被缓存，再次解析时不重新解析、不重复记录错误
+        parsed = len(calls)
+        with pytest.raises(SQLParseError, match='FULL JOIN'):
+            SQLParser().parse_sql(UNSUPPORTED)
+        assert len(calls) == parsed
+        assert len([record for record in caplog.records if record.levelno >= logging.ERROR]) == 1
+    assert lookups() == (1, 1)